@@ -0,0 +1,471 @@
+"""Resumable priority backfill of missing embeddings and summaries.
+
+Rows in document, chunk and entity start out without dense/sparse
+embeddings and summaries. BackfillScheduler fills them in the background,
+one task per (table, column) pair, e.g. "chunk.dense_embedding":
+
+- Pending work is found through partial "needs-X" indexes (e.g.
+  ix_chunk_needs_dense_embedding, WHERE dense_embedding IS NULL), so a
+  batch query only visits rows that still need work, never the full table.
+  Chunks that are near-duplicate aliases (see dedup.py) are skipped.
+- Each batch is taken in priority order: items with a recent event date
+  first, then items recently returned by queries (record_query_hits), then
+  everything else. Every tier is pinned to the index it is ordered by
+  (CROSS JOIN from message, meeting or query_hit; INDEXED BY the needs-X
+  index), so taking a batch neither sorts nor scans the backlog.
+- Results and progress are written together through the Store's write
+  actor, bumping the index generation of the affected sources, so the
+  scheduler resumes where it stopped after a restart. Items the processor
+  returns no value for are recorded and skipped after max_attempts; a
+  processor failing the whole batch is retried later with back-off.
+- After every batch the scheduler sleeps in proportion to the time it was
+  busy, keeping its share of one core within cpu_budget.
+
+Queue depth, throughput and ETA per task are reported by status().
+
+Processors are supplied by the caller, as coroutines mapping a list of input
+texts to one value per text (bytes or a NumPy array for embeddings, str for
+summaries; None marks a failed item):
+
+    scheduler = BackfillScheduler({"chunk.dense_embedding": embed_texts})
+    await scheduler.run(store)
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Iterable, NamedTuple, Optional, Sequence
+
+import numpy as np
+from pydantic import BaseModel, Field
+from sqlalchemy import ColumnElement, Row, Select, bindparam, exists, func, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import SQLModel, col, select
+
+from raggamuffin.cache import bump_generation, index_generation
+from raggamuffin.database import CrossJoin, indexed_by
+from raggamuffin.models import (
+    BackfillFailureTable,
+    BackfillStateTable,
+    ChunkTable,
+    DocumentTable,
+    EntityTable,
+    MeetingTable,
+    MessageTable,
+    QueryHitTable,
+    TextDocumentTable,
+)
+from raggamuffin.store import Store
+
+logger = logging.getLogger(__name__)
+
+Processor = Callable[[list[str]], Awaitable[Sequence[Any]]]
+
+# Weight of the latest batch in the smoothed throughput
+RATE_SMOOTHING = 0.2
+
+
+class BackfillTask(NamedTuple):
+    """A column to fill in for all rows of a table."""
+
+    name: str
+    table: type[SQLModel]
+    column: str
+
+    @property
+    def needs_index(self) -> str:
+        """Partial index of the rows where the column is still missing."""
+        return f"ix_{self.table.__tablename__}_needs_{self.column}"
+
+
+TASKS = {
+    task.name: task
+    for task in (
+        BackfillTask("chunk.dense_embedding", ChunkTable, "dense_embedding"),
+        BackfillTask("chunk.sparse_embedding", ChunkTable, "sparse_embedding"),
+        BackfillTask("document.dense_embedding", DocumentTable, "dense_embedding"),
+        BackfillTask("document.sparse_embedding", DocumentTable, "sparse_embedding"),
+        BackfillTask("document.summary", DocumentTable, "summary"),
+        BackfillTask("entity.dense_embedding", EntityTable, "dense_embedding"),
+        BackfillTask("entity.sparse_embedding", EntityTable, "sparse_embedding"),
+        BackfillTask("entity.summary", EntityTable, "summary"),
+    )
+}
+
+
+class BackfillConfig(BaseModel):
+    """Configuration for the backfill scheduler."""
+
+    # Items handed to a processor at once
+    batch_size: int = Field(default=64, ge=1)
+    # Fraction of one core the scheduler may keep busy
+    cpu_budget: float = Field(default=0.25, gt=0, le=1)
+    # Items with an event date within this many days go first
+    recent_days: float = Field(default=30, ge=0)
+    # Then items returned by a query within this many days
+    hit_days: float = Field(default=7, ge=0)
+    # Items are skipped after failing this often
+    max_attempts: int = Field(default=3, ge=1)
+    # Seconds before retrying a batch the processor failed as a whole,
+    # doubling on every further failure up to max_retry_delay
+    retry_delay: float = Field(default=1, ge=0)
+    max_retry_delay: float = Field(default=300, ge=0)
+
+
+class BackfillStatus(BaseModel):
+    """Queue depth and progress of a backfill task."""
+
+    task: str
+    pending: int
+    processed: int = 0
+    failed: int = 0
+    # Items per second, including throttling
+    rate: Optional[float] = None
+
+    @property
+    def eta(self) -> Optional[timedelta]:
+        """Estimated time until the queue is empty, at the current rate."""
+        if not self.pending:
+            return timedelta(0)
+        if not self.rate:
+            return None
+        return timedelta(seconds=self.pending / self.rate)
+
+
+async def record_query_hits(
+    session: AsyncSession, item_ids: Iterable[uuid.UUID]
+) -> None:
+    """Note that items were returned by a query; the caller commits."""
+    now = datetime.now(timezone.utc)
+    rows = [{"item_id": item_id, "last_hit": now} for item_id in set(item_ids)]
+    if not rows:
+        return
+    stmt = insert(QueryHitTable)
+    await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[col(QueryHitTable.item_id)],
+            set_={
+                "hits": col(QueryHitTable.hits) + 1,
+                "last_hit": stmt.excluded.last_hit,
+            },
+        ),
+        rows,
+    )
+
+
+def _to_value(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return value.tobytes()
+    return value
+
+
+# ============================================================================
+# Scheduler
+# ============================================================================
+
+
+class BackfillScheduler:
+    """Fill missing embeddings and summaries in priority order."""
+
+    config: BackfillConfig
+
+    def __init__(
+        self,
+        processors: dict[str, Processor],
+        config: Optional[BackfillConfig] = None,
+    ):
+        unknown = set(processors) - set(TASKS)
+        if unknown:
+            raise ValueError(f"Unknown backfill tasks: {', '.join(sorted(unknown))}")
+        self.processors = processors
+        self.config = config or BackfillConfig()
+        # Delay before retrying a task whose processor failed, per task
+        self._retry_delays: dict[str, float] = {}
+
+    def _select(
+        self, task: BackfillTask, driver: Any = None, onclause: Any = None
+    ) -> Select[Any]:
+        """(id, text) of items still needing task.
+
+        With a driver table, SQLite looks up the items from its rows in
+        join order (CROSS JOIN) rather than picking a plan itself.
+        """
+        table: Any = task.table
+        source: Any = table if driver is None else CrossJoin(driver, table, onclause)
+        # The IS NULL terms are those of the table's needs-X index
+        conditions: list[ColumnElement[bool]] = [
+            getattr(table, task.column).is_(None),
+            ~exists().where(
+                col(BackfillFailureTable.task) == task.name,
+                col(BackfillFailureTable.item_id) == col(table.id),
+                col(BackfillFailureTable.attempts) >= self.config.max_attempts,
+            ),
+        ]
+
+        if table is EntityTable:
+            text = col(EntityTable.name)
+        elif table is ChunkTable:
+            conditions.append(col(ChunkTable.canonical_id).is_(None))
+            text = col(ChunkTable.text)
+        else:
+            source = CrossJoin(
+                source,
+                TextDocumentTable,
+                col(TextDocumentTable.id) == col(DocumentTable.id),
+            )
+            text = col(TextDocumentTable.text)
+        return (
+            select(col(table.id), text.label("text"))
+            .select_from(source)
+            .where(*conditions)
+        )
+
+    def pending(self, task: BackfillTask) -> Select[Any]:
+        """(id, text) of all items still needing task, in id order.
+
+        The table is scanned through its partial needs-X index, so the
+        query only visits pending rows and needs no sort.
+        """
+        table: Any = task.table
+        return indexed_by(
+            self._select(task).order_by(col(table.id)), table, task.needs_index
+        )
+
+    def tiers(self, task: BackfillTask) -> list[Select[Any]]:
+        """Queries for pending items, highest priority first.
+
+        Each tier is driven by an index and ordered along it, so taking a
+        batch never sorts the backlog:
+        - recent messages and meetings, by event_date (ix_*_event_date);
+        - items returned by recent queries, by last_hit (ix_query_hit_last_hit);
+        - everything else, in needs-X index order.
+        """
+        now = datetime.now(timezone.utc)
+        table: Any = task.table
+        tiers: list[Select[Any]] = []
+
+        if table is not EntityTable:
+            # Entities have no event date
+            document_id = (
+                col(ChunkTable.document_id)
+                if table is ChunkTable
+                else col(DocumentTable.id)
+            )
+            recent = now - timedelta(days=self.config.recent_days)
+            for event in (MessageTable, MeetingTable):
+                event_date = col(event.event_date)
+                tiers.append(
+                    self._select(task, event, document_id == col(event.id))
+                    .where(event_date >= recent)
+                    .order_by(event_date.desc())
+                )
+
+        last_hit = col(QueryHitTable.last_hit)
+        tiers.append(
+            self._select(
+                task, QueryHitTable, col(table.id) == col(QueryHitTable.item_id)
+            )
+            .where(last_hit >= now - timedelta(days=self.config.hit_days))
+            .order_by(last_hit.desc())
+        )
+        tiers.append(self.pending(task))
+        return tiers
+
+    async def next_batch(
+        self, session: AsyncSession, task: BackfillTask
+    ) -> list[Row[Any]]:
+        """The highest priority batch of pending (id, text) rows for task."""
+        batch: dict[uuid.UUID, Row[Any]] = {}
+        for tier in self.tiers(task):
+            missing = self.config.batch_size - len(batch)
+            if missing <= 0:
+                break
+            # Over-fetch by what is already taken, which may come back again
+            result = await session.execute(tier.limit(missing + len(batch)))
+            for row in result.all():
+                if len(batch) < self.config.batch_size:
+                    batch.setdefault(row.id, row)
+        return list(batch.values())
+
+    async def _record_failures(
+        self,
+        session: AsyncSession,
+        task: BackfillTask,
+        item_ids: Sequence[uuid.UUID],
+        error: str,
+    ) -> None:
+        stmt = insert(BackfillFailureTable)
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[
+                    col(BackfillFailureTable.task),
+                    col(BackfillFailureTable.item_id),
+                ],
+                set_={
+                    "attempts": col(BackfillFailureTable.attempts) + 1,
+                    "error": stmt.excluded.error,
+                },
+            ),
+            [
+                {"task": task.name, "item_id": item_id, "error": error}
+                for item_id in item_ids
+            ],
+        )
+
+    async def _bump_generations(
+        self, session: AsyncSession, task: BackfillTask, item_ids: list[uuid.UUID]
+    ) -> dict[uuid.UUID, int]:
+        """Bump the sources of items whose column was filled in."""
+        if task.table is ChunkTable:
+            stmt = (
+                select(DocumentTable.source_id)
+                .join(ChunkTable, col(ChunkTable.document_id) == col(DocumentTable.id))
+                .where(col(ChunkTable.id).in_(item_ids))
+            )
+        elif task.table is DocumentTable:
+            stmt = select(DocumentTable.source_id).where(
+                col(DocumentTable.id).in_(item_ids)
+            )
+        else:
+            # Entities belong to no source
+            return {}
+        source_ids = set((await session.execute(stmt.distinct())).scalars())
+        return {
+            source_id: await bump_generation(session, source_id)
+            for source_id in source_ids
+        }
+
+    async def run_batch(self, store: Store, task: BackfillTask) -> int:
+        """Process and checkpoint one batch of task; returns items taken.
+
+        If the processor fails as a whole, the batch is retried after a
+        growing delay; only items it returns None for count as failed.
+        """
+        started = time.monotonic()
+        async with store.read() as session:
+            rows = await self.next_batch(session, task)
+        if not rows:
+            return 0
+
+        try:
+            values = list(await self.processors[task.name]([row.text for row in rows]))
+            if len(values) != len(rows):
+                raise ValueError(f"Expected {len(rows)} values, got {len(values)}")
+        except Exception as e:
+            delay = min(
+                2 * self._retry_delays.get(task.name, self.config.retry_delay / 2),
+                self.config.max_retry_delay,
+            )
+            self._retry_delays[task.name] = delay
+            logger.warning(
+                "Backfill batch of %s failed, retrying in %.0fs: %s",
+                task.name,
+                delay,
+                e,
+            )
+            await asyncio.sleep(delay)
+            return len(rows)
+        self._retry_delays.pop(task.name, None)
+
+        done = [
+            {"_id": row.id, "value": _to_value(value)}
+            for row, value in zip(rows, values)
+            if value is not None
+        ]
+        failed = [row.id for row, value in zip(rows, values) if value is None]
+
+        # Throughput as seen from outside, i.e. including the throttle pause
+        busy = time.monotonic() - started
+        pause = busy * (1 - self.config.cpu_budget) / self.config.cpu_budget
+        rate = len(rows) / max(busy + pause, 1e-6)
+
+        async def write(session: AsyncSession) -> dict[uuid.UUID, int]:
+            table: Any = task.table.__table__  # type: ignore[attr-defined]
+            if done:
+                await session.execute(
+                    update(table)
+                    .where(table.c.id == bindparam("_id"))
+                    .values({task.column: bindparam("value")}),
+                    done,
+                )
+            if failed:
+                await self._record_failures(session, task, failed, "No value returned")
+
+            state = await session.get(BackfillStateTable, task.name)
+            if state is None:
+                state = BackfillStateTable(task=task.name)
+            state.processed += len(done)
+            state.failed += len(failed)
+            state.rate = (
+                rate
+                if state.rate is None
+                else RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * state.rate
+            )
+            state.updated = datetime.now(timezone.utc)
+            session.add(state)
+
+            if not done:
+                return {}
+            return await self._bump_generations(
+                session, task, [item["_id"] for item in done]
+            )
+
+        generations = await store.write(write)
+        for source_id, generation in generations.items():
+            index_generation.bump(source_id, generation)
+
+        logger.debug("Backfilled %d of %s in %.2fs", len(done), task.name, busy)
+        await asyncio.sleep(pause)
+        return len(rows)
+
+    async def run(
+        self,
+        store: Store,
+        stop: Optional[asyncio.Event] = None,
+        idle_interval: Optional[float] = None,
+    ) -> None:
+        """Process batches of all tasks with a processor, in turn.
+
+        Returns once nothing is pending, or, with idle_interval set, keeps
+        polling for new work every idle_interval seconds until stop is set.
+        """
+        tasks = [TASKS[name] for name in self.processors]
+        while stop is None or not stop.is_set():
+            taken = 0
+            for task in tasks:
+                taken += await self.run_batch(store, task)
+            if taken:
+                continue
+            if idle_interval is None:
+                return
+            try:
+                await asyncio.wait_for(
+                    (stop or asyncio.Event()).wait(), timeout=idle_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    async def status(
+        self, session: AsyncSession, tasks: Optional[Iterable[str]] = None
+    ) -> list[BackfillStatus]:
+        """Queue depth, progress and throughput per task (default: all)."""
+        statuses = []
+        for name in TASKS if tasks is None else tasks:
+            task = TASKS[name]
+            pending = await session.scalar(
+                select(func.count()).select_from(self.pending(task).subquery())
+            )
+            state = await session.get(BackfillStateTable, name)
+            statuses.append(
+                BackfillStatus(
+                    task=name,
+                    pending=pending or 0,
+                    processed=state.processed if state else 0,
+                    failed=state.failed if state else 0,
+                    rate=state.rate if state else None,
+                )
+            )
+        return statuses
@@ -0,0 +1,307 @@
+"""Query-layer cache with ingest-aware invalidation.
+
+Agents retry and rephrase, so the same (or nearly the same) query arrives
+many times within one LLM session. QueryCache keeps three bounded LRU+TTL
+namespaces:
+
+- embeddings: query text -> query embedding (independent of the index)
+- results: query key -> retrieval results
+- context: query key -> rendered context
+
+Results and context are tagged with the index generation of the sources they
+were computed from. The write path bumps the generation of a source whenever
+it ingests into it (see bump_generation), which makes exactly the entries
+depending on that source stale, without flushing the rest of the cache.
+
+The snapshot must be taken before retrieval starts, so results computed
+while an ingest commits are already stale when they are stored:
+
+    snapshot = cache.snapshot(source_ids)
+    results = await retrieve(query)
+    cache.put_results(query, results, snapshot=snapshot)
+
+The cache is not thread-safe; use it from the event loop.
+"""
+
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Generic, Hashable, Iterable, Optional, TypeVar
+
+import numpy as np
+from pydantic import BaseModel
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col, select
+
+from raggamuffin.models import SourceTable
+
+V = TypeVar("V")
+
+# Snapshot of the generations a cached value was computed against.
+# A source id of None stands for "all sources".
+GenerationSnapshot = tuple[tuple[Optional[uuid.UUID], int], ...]
+
+
+# ============================================================================
+# Index Generations
+# ============================================================================
+
+
+class IndexGeneration:
+    """Monotonic per-source index generation counters.
+
+    Besides a counter per source, a total counter is kept that changes on
+    any bump; it is used for queries spanning all sources.
+    """
+
+    def __init__(self) -> None:
+        self._generations: dict[uuid.UUID, int] = {}
+        self._total = 0
+
+    def get(self, source_id: uuid.UUID) -> int:
+        return self._generations.get(source_id, 0)
+
+    def bump(self, source_id: uuid.UUID, generation: Optional[int] = None) -> int:
+        """Advance the generation of a source, optionally to a known value."""
+        current = self.get(source_id)
+        new = current + 1 if generation is None else max(current, generation)
+        if new != current:
+            self._generations[source_id] = new
+            self._total += new - current
+        return new
+
+    def update(self, generations: dict[uuid.UUID, int]) -> None:
+        """Merge generations loaded from elsewhere; counters never go back."""
+        for source_id, generation in generations.items():
+            self.bump(source_id, generation)
+
+    def snapshot(
+        self, source_ids: Optional[Iterable[uuid.UUID]] = None
+    ) -> GenerationSnapshot:
+        """Capture the generations of source_ids (None: all sources)."""
+        if source_ids is None:
+            return ((None, self._total),)
+        return tuple(
+            (source_id, self.get(source_id)) for source_id in sorted(set(source_ids))
+        )
+
+    def is_current(self, snapshot: GenerationSnapshot) -> bool:
+        return all(
+            generation == (self._total if source_id is None else self.get(source_id))
+            for source_id, generation in snapshot
+        )
+
+
+async def bump_generation(session: AsyncSession, source_id: uuid.UUID) -> int:
+    """Bump the stored index generation of a source after writing to it.
+
+    Call this in the same transaction as the ingest, so readers in other
+    processes pick up the new generation together with the new rows. Pass
+    the returned generation to IndexGeneration.bump() only once the
+    transaction has committed; before that, readers do not see the rows yet.
+    """
+    result = await session.execute(
+        update(SourceTable)
+        .where(col(SourceTable.id) == source_id)
+        .values(generation=col(SourceTable.generation) + 1)
+        .returning(col(SourceTable.generation))
+    )
+    return result.scalar_one()
+
+
+async def load_generations(
+    session: AsyncSession, generations: Optional[IndexGeneration] = None
+) -> None:
+    """Refresh in-memory generations from the database.
+
+    Processes that only read (e.g. the MCP server) call this before serving
+    queries to observe ingests done by other processes.
+    """
+    rows = await session.execute(select(SourceTable.id, SourceTable.generation))
+    (generations or index_generation).update(
+        {source_id: generation for source_id, generation in rows}
+    )
+
+
+# Process-wide generations, shared by the write path and query caches.
+index_generation = IndexGeneration()
+
+
+# ============================================================================
+# LRU + TTL cache
+# ============================================================================
+
+
+class CacheStats(BaseModel):
+    """Counters for a cache namespace."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class LRUCache(Generic[V]):
+    """Bounded LRU cache whose entries expire after ttl seconds.
+
+    Entries may carry a generation snapshot; they are treated as misses once
+    the snapshot is no longer current.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        generations: Optional[IndexGeneration] = None,
+    ):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generations = generations or index_generation
+        self.stats = CacheStats()
+        self._entries: OrderedDict[Hashable, tuple[float, GenerationSnapshot, V]] = (
+            OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[V]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        expires, snapshot, value = entry
+        if expires < time.monotonic():
+            self.stats.expirations += 1
+        elif not self.generations.is_current(snapshot):
+            self.stats.invalidations += 1
+        else:
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+        del self._entries[key]
+        self.stats.misses += 1
+        return None
+
+    def put(
+        self,
+        key: Hashable,
+        value: V,
+        snapshot: GenerationSnapshot = (),
+    ) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, snapshot, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+# ============================================================================
+# Query cache
+# ============================================================================
+
+
+def normalize_query(query: str) -> str:
+    """Normalize trivial query variations (case, whitespace, end punctuation)."""
+    return " ".join(query.casefold().split()).strip(" .?!")
+
+
+class QueryCache:
+    """Cache for query embeddings, retrieval results and rendered context.
+
+    `key` arguments identify a query beyond its text, e.g. (query, top_k,
+    filters); the text part is normalized. Results and context are stored
+    with the snapshot() of the sources they are computed from, taken before
+    retrieval.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 15 * 60,
+        embedding_maxsize: int = 4096,
+        embedding_ttl: float = 60 * 60,
+        generations: Optional[IndexGeneration] = None,
+    ):
+        self.generations = generations or index_generation
+        self.embeddings: LRUCache[np.ndarray] = LRUCache(
+            embedding_maxsize, embedding_ttl, self.generations
+        )
+        self.results: LRUCache[Any] = LRUCache(maxsize, ttl, self.generations)
+        self.context: LRUCache[str] = LRUCache(maxsize, ttl, self.generations)
+
+    @staticmethod
+    def _key(query: str, *extra: Hashable) -> Hashable:
+        return (normalize_query(query), *extra)
+
+    def get_embedding(self, query: str, model: str = "") -> Optional[np.ndarray]:
+        return self.embeddings.get(self._key(query, model))
+
+    def put_embedding(self, query: str, embedding: np.ndarray, model: str = "") -> None:
+        self.embeddings.put(self._key(query, model), embedding)
+
+    def snapshot(
+        self, source_ids: Optional[Iterable[uuid.UUID]] = None
+    ) -> GenerationSnapshot:
+        """Generations to store results with; take it before retrieving."""
+        return self.generations.snapshot(source_ids)
+
+    def get_results(self, query: str, *extra: Hashable) -> Optional[Any]:
+        return self.results.get(self._key(query, *extra))
+
+    def put_results(
+        self,
+        query: str,
+        results: Any,
+        *extra: Hashable,
+        snapshot: GenerationSnapshot,
+    ) -> None:
+        self.results.put(self._key(query, *extra), results, snapshot)
+
+    def get_context(self, query: str, *extra: Hashable) -> Optional[str]:
+        return self.context.get(self._key(query, *extra))
+
+    def put_context(
+        self,
+        query: str,
+        context: str,
+        *extra: Hashable,
+        snapshot: GenerationSnapshot,
+    ) -> None:
+        self.context.put(self._key(query, *extra), context, snapshot)
+
+    @property
+    def stats(self) -> dict[str, CacheStats]:
+        return {
+            "embeddings": self.embeddings.stats,
+            "results": self.results.stats,
+            "context": self.context.stats,
+        }
+
+    @property
+    def hit_ratio(self) -> float:
+        """Overall hit ratio across all namespaces."""
+        hits = sum(stats.hits for stats in self.stats.values())
+        lookups = hits + sum(stats.misses for stats in self.stats.values())
+        return hits / lookups if lookups else 0.0
+
+    def clear(self) -> None:
+        self.embeddings.clear()
+        self.results.clear()
+        self.context.clear()
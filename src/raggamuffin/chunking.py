@@ -0,0 +1,54 @@
+"""Text chunking for embedding/retrieval.
+
+Chunks are plain tuples so they are cheap to pickle across process
+boundaries (see workers.py) and map directly onto ChunkTable columns.
+"""
+
+from typing import NamedTuple
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CHUNK_OVERLAP = 200
+
+
+class TextChunk(NamedTuple):
+    """A slice of a document's text with its character offsets."""
+
+    sequence: int
+    start_offset: int
+    end_offset: int
+    text: str
+
+
+def chunk_text(
+    text: str,
+    size: int = DEFAULT_CHUNK_SIZE,
+    overlap: int = DEFAULT_CHUNK_OVERLAP,
+) -> list[TextChunk]:
+    """Split text into overlapping windows of at most `size` characters.
+
+    Window ends are moved back to the last whitespace in the second half of
+    the window, so words are not cut in half where avoidable.
+    """
+    if size <= 0:
+        raise ValueError("size must be positive")
+    if not 0 <= overlap < size:
+        raise ValueError("overlap must be in [0, size)")
+
+    chunks: list[TextChunk] = []
+    start = 0
+    length = len(text)
+
+    while start < length:
+        end = min(start + size, length)
+        if end < length:
+            split = text.rfind(" ", start + size // 2, end)
+            if split != -1:
+                end = split + 1
+
+        chunks.append(TextChunk(len(chunks), start, end, text[start:end]))
+
+        if end == length:
+            break
+        start = max(end - overlap, start + 1)
+
+    return chunks
@@ -0,0 +1,399 @@
+"""Storage compaction and garbage collection.
+
+SQLite does not enforce the schema's foreign keys here, so deleting or
+re-ingesting documents, entities and sources leaves rows behind: chunks
+and their LSH bands, link-table rows, materialized metadata, importer
+state, and embeddings on chunks that have since become dedup aliases. The
+file itself never shrinks unless it is vacuumed.
+
+compact() finds orphans in bulk with anti-join (NOT EXISTS) queries on the
+parents' primary keys and deletes them in bounded batches, walking each
+table in rowid order and committing after every batch, so no write lock is
+held for long. It then
+- clears embeddings held by dedup aliases,
+- returns free pages to the file system with PRAGMA incremental_vacuum
+  (switching a database to auto_vacuum=INCREMENTAL takes one full VACUUM,
+  see CompactionConfig.full_vacuum),
+- truncates the WAL, refreshes statistics (ANALYZE) and runs
+  PRAGMA optimize,
+and reports what was removed, space reclaimed and time taken.
+
+Rules are ordered parents first, so rows orphaned by an earlier rule (e.g.
+the message row of a deleted text_document) are collected in the same run.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, NamedTuple, Optional
+
+from pydantic import BaseModel, Field
+from sqlalchemy import (
+    Integer,
+    Table,
+    delete,
+    exists,
+    func,
+    literal_column,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from raggamuffin.models import (
+    BackfillFailureTable,
+    ChunkLSHBandTable,
+    ChunkTable,
+    DocumentCreatorLink,
+    DocumentMetadataTable,
+    DocumentSetDocumentLink,
+    DocumentSetTable,
+    DocumentTable,
+    EntityIdentifierTable,
+    EntitySourceLink,
+    EntityTable,
+    ImageTable,
+    ImportStateTable,
+    MeetingParticipantLink,
+    MeetingTable,
+    MessageRecipientLink,
+    MessageTable,
+    MetadataKeyTable,
+    OrganizationHierarchyLink,
+    OrganizationPersonLink,
+    QueryHitTable,
+    SourceTable,
+    TextDocumentTable,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _table(model: Any) -> Table:
+    return model.__table__
+
+
+class OrphanRule(NamedTuple):
+    """Rows of table whose column matches no row of any of the parents."""
+
+    table: Table
+    column: str
+    # (table, column) pairs the value may refer to
+    parents: tuple[tuple[Table, str], ...]
+
+    @property
+    def name(self) -> str:
+        return f"{self.table.name}.{self.column}"
+
+    def condition(self) -> Any:
+        value = self.table.c[self.column]
+        return value.is_not(None) & ~or_(
+            *(
+                # Aliased, so a self-reference is not correlated with the row
+                exists().where(parent.alias().c[parent_column] == value)
+                for parent, parent_column in self.parents
+            )
+        )
+
+
+def _rule(model: Any, column: str, *parents: tuple[Any, str]) -> OrphanRule:
+    return OrphanRule(
+        _table(model),
+        column,
+        tuple((_table(parent), parent_column) for parent, parent_column in parents),
+    )
+
+
+DOCUMENT = (DocumentTable, "id")
+ENTITY = (EntityTable, "id")
+SOURCE = (SourceTable, "id")
+CHUNK = (ChunkTable, "id")
+ITEMS = (DOCUMENT, CHUNK, ENTITY)
+
+# Parents first: rows orphaned by one rule are found by the later ones
+DELETE_RULES = (
+    _rule(TextDocumentTable, "id", DOCUMENT),
+    _rule(ImageTable, "id", DOCUMENT),
+    _rule(MessageTable, "id", (TextDocumentTable, "id")),
+    _rule(MeetingTable, "id", (TextDocumentTable, "id")),
+    _rule(MeetingParticipantLink, "meeting_id", (MeetingTable, "id")),
+    _rule(MeetingParticipantLink, "participant_id", ENTITY),
+    _rule(MessageRecipientLink, "message_id", (MessageTable, "id")),
+    _rule(MessageRecipientLink, "recipient_id", ENTITY),
+    _rule(ChunkTable, "document_id", DOCUMENT),
+    _rule(ChunkLSHBandTable, "chunk_id", CHUNK),
+    _rule(DocumentCreatorLink, "document_id", DOCUMENT),
+    _rule(DocumentCreatorLink, "creator_id", ENTITY),
+    _rule(DocumentSetDocumentLink, "document_id", DOCUMENT),
+    _rule(DocumentSetDocumentLink, "document_set_id", (DocumentSetTable, "id")),
+    _rule(DocumentMetadataTable, "document_id", DOCUMENT),
+    _rule(DocumentMetadataTable, "key", (MetadataKeyTable, "key")),
+    _rule(EntitySourceLink, "entity_id", ENTITY),
+    _rule(EntitySourceLink, "source_id", SOURCE),
+    _rule(EntityIdentifierTable, "entity_id", ENTITY),
+    _rule(OrganizationPersonLink, "organization_id", ENTITY),
+    _rule(OrganizationPersonLink, "person_id", ENTITY),
+    _rule(OrganizationHierarchyLink, "parent_id", ENTITY),
+    _rule(OrganizationHierarchyLink, "child_id", ENTITY),
+    _rule(ImportStateTable, "source_id", SOURCE),
+    _rule(QueryHitTable, "item_id", *ITEMS),
+    _rule(BackfillFailureTable, "item_id", *ITEMS),
+)
+
+# Aliases whose canonical chunk is gone become canonical themselves (and
+# are picked up by the embedding backfill)
+NULLIFY_RULES = (_rule(ChunkTable, "canonical_id", CHUNK),)
+
+
+class CompactionConfig(BaseModel):
+    """Configuration for compaction runs."""
+
+    # Rows deleted or updated per transaction
+    batch_size: int = Field(default=5000, ge=1)
+    # Seconds to pause between batches, giving other writers a turn
+    pause: float = Field(default=0.0, ge=0)
+    # Free pages released per incremental_vacuum step
+    vacuum_pages: int = Field(default=2000, ge=1)
+    # Rows ANALYZE samples per index (PRAGMA analysis_limit; 0: all)
+    analysis_limit: int = Field(default=1000, ge=0)
+    # Rebuild the file with a full VACUUM, which also switches it to
+    # auto_vacuum=INCREMENTAL. Incremental vacuuming only releases pages
+    # that became entirely free; a rebuild also repacks partly used pages,
+    # but rewrites the whole file and locks it meanwhile.
+    full_vacuum: bool = False
+    # Only count rows orphaned now (not those the deletes would orphan)
+    dry_run: bool = False
+
+
+class CompactionReport(BaseModel):
+    """What a compaction run removed, and what it took."""
+
+    # Rows deleted (or counted, in a dry run) per "table.column" rule
+    deleted: dict[str, int] = Field(default_factory=dict)
+    # Dangling references set to NULL
+    nullified: int = 0
+    # Alias chunks whose embeddings were cleared
+    embeddings_cleared: int = 0
+    size_before: int = 0
+    size_after: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_deleted(self) -> int:
+        return sum(self.deleted.values())
+
+    @property
+    def reclaimed(self) -> int:
+        """Bytes returned to the file system (database and WAL files)."""
+        return self.size_before - self.size_after
+
+
+def database_size(engine: AsyncEngine) -> int:
+    """Size in bytes of the database file and its WAL."""
+    database = engine.url.database
+    if not database or database == ":memory:":
+        return 0
+    return sum(
+        os.path.getsize(path)
+        for path in (database, f"{database}-wal")
+        if os.path.exists(path)
+    )
+
+
+# ============================================================================
+# Garbage collection
+# ============================================================================
+
+
+async def _batched(
+    engine: AsyncEngine,
+    table: Table,
+    condition: Any,
+    apply: Any,
+    pause: float,
+    size: int,
+) -> int:
+    """Apply a DELETE/UPDATE to matching rows, size rows per transaction.
+
+    Rows are visited in rowid order from a cursor, so every batch starts
+    where the previous one stopped instead of rescanning the table.
+    """
+    rowid = literal_column(f"{table.name}.rowid", Integer)
+    cursor = 0
+    total = 0
+    while True:
+        async with engine.begin() as conn:
+            result = await conn.execute(
+                select(rowid)
+                .select_from(table)
+                .where(condition, rowid > cursor)
+                .order_by(rowid)
+                .limit(size)
+            )
+            rowids = list(result.scalars().all())
+            if not rowids:
+                return total
+            await conn.execute(apply.where(rowid.in_(rowids)))
+        total += len(rowids)
+        cursor = rowids[-1]
+        if pause:
+            await asyncio.sleep(pause)
+
+
+async def _count(engine: AsyncEngine, table: Table, condition: Any) -> int:
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            select(func.count()).select_from(table).where(condition)
+        )
+        return result.scalar() or 0
+
+
+async def collect_garbage(
+    engine: AsyncEngine, config: CompactionConfig, report: CompactionReport
+) -> None:
+    """Delete orphaned rows and stale alias embeddings, in batches."""
+    chunk = _table(ChunkTable)
+    stale_embeddings = chunk.c.canonical_id.is_not(None) & or_(
+        chunk.c.dense_embedding.is_not(None), chunk.c.sparse_embedding.is_not(None)
+    )
+
+    for rule in DELETE_RULES:
+        condition = rule.condition()
+        if config.dry_run:
+            count = await _count(engine, rule.table, condition)
+        else:
+            count = await _batched(
+                engine,
+                rule.table,
+                condition,
+                delete(rule.table),
+                config.pause,
+                config.batch_size,
+            )
+        if count:
+            report.deleted[rule.name] = count
+            logger.info("Orphans in %s: %d", rule.name, count)
+
+    for rule in NULLIFY_RULES:
+        condition = rule.condition()
+        if config.dry_run:
+            report.nullified += await _count(engine, rule.table, condition)
+        else:
+            report.nullified += await _batched(
+                engine,
+                rule.table,
+                condition,
+                update(rule.table).values({rule.column: None}),
+                config.pause,
+                config.batch_size,
+            )
+
+    if config.dry_run:
+        report.embeddings_cleared = await _count(engine, chunk, stale_embeddings)
+    else:
+        report.embeddings_cleared = await _batched(
+            engine,
+            chunk,
+            stale_embeddings,
+            update(chunk).values(dense_embedding=None, sparse_embedding=None),
+            config.pause,
+            config.batch_size,
+        )
+
+
+# ============================================================================
+# Vacuum and statistics
+# ============================================================================
+
+
+async def _pragma(conn: AsyncConnection, pragma: str) -> Any:
+    result = await conn.exec_driver_sql(f"PRAGMA {pragma}")
+    # Setting a pragma usually returns nothing
+    return result.scalar() if result.returns_rows else None
+
+
+async def incremental_vacuum(conn: AsyncConnection, pages: int) -> None:
+    """Release up to pages free pages, in one step.
+
+    The sqlite3 module steps a statement without result columns only once,
+    and every step of PRAGMA incremental_vacuum frees a single page; fetching
+    does not step it further. executescript() runs it to completion.
+    """
+    raw = await conn.get_raw_connection()
+    driver = raw.driver_connection
+    assert driver is not None
+    await driver.executescript(f"PRAGMA incremental_vacuum({pages})")
+
+
+async def vacuum(engine: AsyncEngine, config: CompactionConfig) -> None:
+    """Release free pages, truncate the WAL and refresh planner statistics."""
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+
+        incremental = await _pragma(conn, "auto_vacuum") == 2
+        if config.full_vacuum:
+            logger.info("Rebuilding database with auto_vacuum=INCREMENTAL")
+            await _pragma(conn, "auto_vacuum=INCREMENTAL")
+            await conn.exec_driver_sql("VACUUM")
+            incremental = True
+        elif not incremental:
+            logger.warning(
+                "Database is not in auto_vacuum=INCREMENTAL mode; free pages "
+                "are reused but not released until a full vacuum"
+            )
+
+        # Each step is a short transaction of its own
+        while incremental and await _pragma(conn, "freelist_count"):
+            await incremental_vacuum(conn, config.vacuum_pages)
+            if config.pause:
+                await asyncio.sleep(config.pause)
+
+        await _pragma(conn, "wal_checkpoint(TRUNCATE)")
+        await _pragma(conn, f"analysis_limit={config.analysis_limit}")
+        await conn.exec_driver_sql("ANALYZE")
+        await _pragma(conn, "optimize")
+
+
+async def compact(
+    engine: AsyncEngine, config: Optional[CompactionConfig] = None
+) -> CompactionReport:
+    """Collect garbage, then vacuum and optimize the database."""
+    config = config or CompactionConfig()
+    started = time.monotonic()
+    report = CompactionReport(size_before=database_size(engine))
+
+    await collect_garbage(engine, config, report)
+    if not config.dry_run:
+        await vacuum(engine, config)
+
+    report.size_after = database_size(engine)
+    report.seconds = time.monotonic() - started
+    logger.info(
+        "Compacted %s: %d orphans, %d bytes reclaimed in %.1fs",
+        engine.url.database,
+        report.rows_deleted,
+        report.reclaimed,
+        report.seconds,
+    )
+    return report
+
+
+async def compact_periodically(
+    engine: AsyncEngine,
+    interval: float,
+    config: Optional[CompactionConfig] = None,
+    stop: Optional[asyncio.Event] = None,
+) -> None:
+    """Run compact() every interval seconds until stop is set."""
+    stop = stop or asyncio.Event()
+    while not stop.is_set():
+        try:
+            await compact(engine, config)
+        except Exception:
+            logger.exception("Compaction failed")
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,206 @@
+"""Neighbour-chunk context expansion for retrieval hits.
+
+A matching chunk rarely carries enough context on its own; the LLM usually
+needs the chunks around it as well. Instead of one query per hit,
+expand_context() takes the whole hit list and:
+
+1. turns every hit into a window of sequence ± radius in its document;
+2. merges overlapping and adjacent windows per document (merge_windows);
+3. fetches all windows in a single query, joining a VALUES list of
+   (document_id, first, last) ranges on the (document_id, sequence) index;
+4. stitches each window's chunks back into one text, using start_offset /
+   end_offset to drop the overlap between consecutive chunks (stitch).
+
+Only the columns needed for stitching are loaded, not the embeddings and
+signatures stored with every chunk.
+
+Windows come back in the order of their best-ranked hit.
+"""
+
+import uuid
+from typing import Iterable, NamedTuple, Optional, Protocol, Sequence
+
+from pydantic import BaseModel
+from sqlalchemy import Integer, and_, column, select, values
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col
+
+from raggamuffin.models import ChunkTable
+
+DEFAULT_RADIUS = 1
+
+# Joins chunks that are not contiguous, e.g. when a neighbour is missing
+GAP_SEPARATOR = "\n\n[...]\n\n"
+
+
+class ChunkText(Protocol):
+    """The parts of a chunk stitch() needs; a ChunkTable or a ChunkSpan."""
+
+    @property
+    def sequence(self) -> int: ...
+    @property
+    def start_offset(self) -> Optional[int]: ...
+    @property
+    def end_offset(self) -> Optional[int]: ...
+    @property
+    def text(self) -> str: ...
+
+
+class ChunkSpan(NamedTuple):
+    """The columns of a chunk loaded for stitching."""
+
+    document_id: uuid.UUID
+    sequence: int
+    start_offset: Optional[int]
+    end_offset: Optional[int]
+    text: str
+
+
+class WindowRange(NamedTuple):
+    """A range of chunk sequences in a document, with the hits it covers."""
+
+    document_id: uuid.UUID
+    first: int
+    last: int
+    # Ranks (positions in the hit list) of the hits inside this range
+    ranks: list[int]
+
+
+class ContextWindow(BaseModel):
+    """Stitched text of consecutive chunks around one or more hits."""
+
+    document_id: uuid.UUID
+    first_sequence: int
+    last_sequence: int
+    start_offset: Optional[int] = None
+    end_offset: Optional[int] = None
+    text: str
+    # Ids of the hits this window was expanded from, best ranked first
+    hit_ids: list[uuid.UUID]
+
+
+def merge_windows(hits: Sequence[ChunkTable], radius: int) -> list[WindowRange]:
+    """Windows of sequence ± radius around hits, merged per document.
+
+    Windows that overlap or touch are merged. The result is ordered by the
+    best (lowest) rank of the hits each window covers.
+    """
+    if radius < 0:
+        raise ValueError("radius must not be negative")
+
+    by_document: dict[uuid.UUID, list[tuple[int, int]]] = {}
+    for rank, hit in enumerate(hits):
+        by_document.setdefault(hit.document_id, []).append((hit.sequence, rank))
+
+    windows: list[WindowRange] = []
+    for document_id, entries in by_document.items():
+        entries.sort()
+        current: Optional[WindowRange] = None
+        for sequence, rank in entries:
+            first, last = max(sequence - radius, 0), sequence + radius
+            if current is not None and first <= current.last + 1:
+                current.ranks.append(rank)
+                current = current._replace(last=max(current.last, last))
+            else:
+                if current is not None:
+                    windows.append(current)
+                current = WindowRange(document_id, first, last, [rank])
+        if current is not None:
+            windows.append(current)
+
+    windows.sort(key=lambda window: min(window.ranks))
+    return windows
+
+
+def stitch(chunks: Iterable[ChunkText]) -> tuple[str, Optional[int], Optional[int]]:
+    """Join consecutive chunks of a document into (text, start, end).
+
+    Overlapping chunk text is included once; chunks that do not connect
+    are joined with GAP_SEPARATOR. Without offsets, chunks are joined as-is.
+    """
+    parts: list[str] = []
+    start: Optional[int] = None
+    end: Optional[int] = None
+    for chunk in sorted(chunks, key=lambda chunk: chunk.sequence):
+        if chunk.start_offset is None or chunk.end_offset is None or end is None:
+            if parts:
+                parts.append(GAP_SEPARATOR)
+            parts.append(chunk.text)
+        elif chunk.end_offset <= end:
+            # Entirely contained in what was stitched so far
+            continue
+        elif chunk.start_offset <= end:
+            parts.append(chunk.text[end - chunk.start_offset :])
+        else:
+            parts.append(GAP_SEPARATOR)
+            parts.append(chunk.text)
+
+        if start is None:
+            start = chunk.start_offset
+        if chunk.end_offset is not None:
+            end = max(end or 0, chunk.end_offset)
+
+    return "".join(parts), start, end
+
+
+async def expand_context(
+    session: AsyncSession,
+    hits: Sequence[ChunkTable],
+    radius: int = DEFAULT_RADIUS,
+) -> list[ContextWindow]:
+    """Expand ranked hits into stitched neighbour windows, in one query."""
+    ranges = merge_windows(hits, radius)
+    if not ranges:
+        return []
+
+    window = (
+        values(
+            column("document_id", ChunkTable.__table__.c.document_id.type),  # type: ignore[attr-defined]
+            column("first", Integer),
+            column("last", Integer),
+            name="window",
+        )
+        .data([(r.document_id, r.first, r.last) for r in ranges])
+        .cte("window")
+    )
+    result = await session.execute(
+        select(
+            col(ChunkTable.document_id),
+            col(ChunkTable.sequence),
+            col(ChunkTable.start_offset),
+            col(ChunkTable.end_offset),
+            col(ChunkTable.text),
+        ).join(
+            window,
+            and_(
+                col(ChunkTable.document_id) == window.c.document_id,
+                col(ChunkTable.sequence).between(window.c.first, window.c.last),
+            ),
+        )
+    )
+
+    chunks_by_document: dict[uuid.UUID, list[ChunkSpan]] = {}
+    for row in result.tuples():
+        chunk = ChunkSpan._make(row)
+        chunks_by_document.setdefault(chunk.document_id, []).append(chunk)
+
+    windows: list[ContextWindow] = []
+    for r in ranges:
+        chunks = [
+            chunk
+            for chunk in chunks_by_document.get(r.document_id, [])
+            if r.first <= chunk.sequence <= r.last
+        ]
+        text, start, end = stitch(chunks)
+        windows.append(
+            ContextWindow(
+                document_id=r.document_id,
+                first_sequence=min((c.sequence for c in chunks), default=r.first),
+                last_sequence=max((c.sequence for c in chunks), default=r.last),
+                start_offset=start,
+                end_offset=end,
+                text=text,
+                hit_ids=[hits[rank].id for rank in sorted(r.ranks)],
+            )
+        )
+    return windows
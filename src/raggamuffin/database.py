@@ -0,0 +1,307 @@
+"""Database engines and the optional per-source sharded layout.
+
+By default everything lives in a single SQLite file (get_engine). The
+sharded layout (ShardRouter) keeps one SQLite file per shard key, normally
+a SourceTypeTable slug ("mail", "chat", "files", ...). Every shard carries
+the full schema, so:
+
+- writes for different shards take different writer locks and can run
+  in parallel;
+- reads fan out to all shards concurrently and are merged;
+- a shard can be rebuilt or removed without touching the others.
+"""
+
+import asyncio
+import itertools
+import logging
+import re
+from collections import Counter
+from contextlib import AsyncExitStack, asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterable, Optional
+
+from sqlalchemy import Join, Row, Select, text
+from sqlalchemy.dialects.sqlite.base import SQLiteCompiler
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import Executable, FromClause
+from sqlalchemy.sql.compiler import SQLCompiler
+from sqlmodel import SQLModel
+
+# Import all models to ensure they're registered with SQLModel.metadata
+from raggamuffin import models  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATABASE = "database.db"
+
+# SQLite's default SQLITE_MAX_ATTACHED
+MAX_ATTACHED = 10
+
+SHARD_KEY_RE = re.compile(r"^[a-z0-9][a-z0-9_-]*$")
+
+
+def get_engine(
+    sqlite_file_name: str | Path = DEFAULT_DATABASE, echo: bool = True
+) -> AsyncEngine:
+    """Create async database engine."""
+    sqlite_url = f"sqlite+aiosqlite:///{sqlite_file_name}"
+
+    return create_async_engine(sqlite_url, echo=echo)
+
+
+async def create_all(engine: AsyncEngine) -> None:
+    """Create all tables from the models package."""
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+
+# ============================================================================
+# Query planner controls
+# ============================================================================
+#
+# Without ANALYZE statistics SQLite's planner guesses, and for the backfill
+# queries it guesses wrong: it prefers any equality-constrained index and
+# then sorts. These pin the plan where the right driving index is known.
+
+
+class CrossJoin(Join):
+    """Inner join that SQLite evaluates with the left side as outer loop.
+
+    SQLite never reorders the tables of a CROSS JOIN; other dialects render
+    a plain JOIN.
+    """
+
+    inherit_cache = True
+
+    def __init__(self, left: Any, right: Any, onclause: Any):
+        super().__init__(left, right, onclause)
+
+
+@compiles(CrossJoin, "sqlite")
+def _compile_cross_join(
+    join: CrossJoin,
+    compiler: SQLCompiler,
+    asfrom: bool = False,
+    from_linter: Any = None,
+    **kw: Any,
+) -> str:
+    # As SQLCompiler.visit_join, with the join operator replaced
+    assert join.onclause is not None
+    if from_linter:
+        from_linter.edges.update(
+            itertools.product(join.left._from_objects, join.right._from_objects)
+        )
+    return (
+        join.left._compiler_dispatch(
+            compiler, asfrom=True, from_linter=from_linter, **kw
+        )
+        + " CROSS JOIN "
+        + join.right._compiler_dispatch(
+            compiler, asfrom=True, from_linter=from_linter, **kw
+        )
+        + " ON "
+        + join.onclause._compiler_dispatch(compiler, from_linter=from_linter, **kw)
+    )
+
+
+def _sqlite_from_hint_text(
+    self: SQLiteCompiler, table: FromClause, text: Optional[str]
+) -> Optional[str]:
+    return text
+
+
+# The SQLite dialect drops table hints; render them after the table name
+SQLiteCompiler.get_from_hint_text = _sqlite_from_hint_text  # type: ignore[method-assign]
+
+
+def indexed_by(stmt: Select[Any], table: Any, index: str) -> Select[Any]:
+    """Make SQLite look up table through index, which must be usable."""
+    return stmt.with_hint(table, f"INDEXED BY {index}", "sqlite")
+
+
+class ShardRouter:
+    """Route writes to per-shard SQLite files and fan reads out over them.
+
+    Usage:
+        router = ShardRouter(Path("shards"))
+        async with router.session("mail") as session:
+            session.add(...)
+            await session.commit()
+        rows = await router.fan_out(select(DocumentTable.id))
+    """
+
+    directory: Path
+    echo: bool
+
+    def __init__(self, directory: Path, echo: bool = False):
+        self.directory = directory
+        self.echo = echo
+        self._engines: dict[str, AsyncEngine] = {}
+        # Sessions and connections in flight per shard; removal waits for
+        # them, and no new ones start on a shard being removed
+        self._users: Counter[str] = Counter()
+        self._closing: set[str] = set()
+        self._changed = asyncio.Condition()
+
+    def shard_path(self, key: str) -> Path:
+        if not SHARD_KEY_RE.match(key):
+            raise ValueError(f"Invalid shard key: {key!r}")
+        return self.directory / f"{key}.db"
+
+    def keys(self) -> list[str]:
+        """Keys of all shards present on disk."""
+        if not self.directory.exists():
+            return []
+        return sorted(path.stem for path in self.directory.glob("*.db"))
+
+    async def _acquire(self, key: str, create: bool) -> Optional[AsyncEngine]:
+        """Engine for a shard, in use until _release().
+
+        With create, a missing shard is created with its schema; otherwise
+        None is returned for it, so reads never leave files behind.
+        """
+        path = self.shard_path(key)
+        async with self._changed:
+            await self._changed.wait_for(lambda: key not in self._closing)
+            engine = self._engines.get(key)
+            if engine is None:
+                if not create and not path.exists():
+                    return None
+                path.parent.mkdir(parents=True, exist_ok=True)
+                engine = get_engine(path, echo=self.echo)
+                await create_all(engine)
+                self._engines[key] = engine
+                logger.info("Opened shard %s at %s", key, path)
+            self._users[key] += 1
+            return engine
+
+    async def _release(self, key: str) -> None:
+        async with self._changed:
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key]
+                self._changed.notify_all()
+
+    @asynccontextmanager
+    async def _using(
+        self, key: str, create: bool
+    ) -> AsyncIterator[Optional[AsyncEngine]]:
+        engine = await self._acquire(key, create)
+        try:
+            yield engine
+        finally:
+            if engine is not None:
+                await self._release(key)
+
+    @asynccontextmanager
+    async def session(self, key: str) -> AsyncIterator[AsyncSession]:
+        """Session bound to a single shard, creating the shard on first use."""
+        async with self._using(key, create=True) as engine:
+            assert engine is not None
+            async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+                yield session
+
+    async def fan_out(
+        self, statement: Executable, keys: Optional[Iterable[str]] = None
+    ) -> list[Row[Any]]:
+        """Run a read statement on all shards concurrently; concatenate rows.
+
+        Keys without a shard on disk are skipped. Ordering and limits apply
+        per shard; callers merging ranked results re-sort the combined rows.
+        """
+
+        async def run(key: str) -> list[Row[Any]]:
+            async with self._using(key, create=False) as engine:
+                if engine is None:
+                    return []
+                async with engine.connect() as conn:
+                    result = await conn.execute(statement)
+                    return list(result.all())
+
+        results = await asyncio.gather(
+            *(run(key) for key in (self.keys() if keys is None else keys))
+        )
+        return [row for rows in results for row in rows]
+
+    @asynccontextmanager
+    async def attached(
+        self, keys: Optional[Iterable[str]] = None
+    ) -> AsyncIterator[AsyncConnection]:
+        """Connection with shards ATTACHed under their key as schema name.
+
+        For ad-hoc cross-shard SQL, e.g.
+        `SELECT id FROM "mail".document UNION ALL SELECT id FROM "chat".document`.
+        Keys without a shard on disk are not attached. SQLite attaches at
+        most MAX_ATTACHED databases per connection.
+        """
+        keys = list(self.keys() if keys is None else keys)
+        if len(keys) > MAX_ATTACHED:
+            raise ValueError(f"Cannot attach more than {MAX_ATTACHED} shards")
+
+        engine = create_async_engine("sqlite+aiosqlite://", echo=self.echo)
+        try:
+            async with AsyncExitStack() as stack, engine.connect() as conn:
+                for key in keys:
+                    if await stack.enter_async_context(self._using(key, create=False)):
+                        path = self.shard_path(key).resolve()
+                        await conn.execute(
+                            text("ATTACH DATABASE :path AS :key"),
+                            {"path": str(path), "key": key},
+                        )
+                yield conn
+        finally:
+            await engine.dispose()
+
+    async def _close(self, key: str) -> None:
+        engine = self._engines.pop(key, None)
+        if engine is not None:
+            await engine.dispose()
+
+    async def remove(self, key: str) -> None:
+        """Delete a shard and its WAL/SHM side files.
+
+        Waits for sessions and connections on the shard to finish; new ones
+        wait until the shard is gone. Must not be called while holding a
+        session on the same shard.
+        """
+        path = self.shard_path(key)
+        async with self._changed:
+            self._closing.add(key)
+            try:
+                await self._changed.wait_for(lambda: not self._users[key])
+                await self._close(key)
+                for suffix in ("", "-wal", "-shm", "-journal"):
+                    path.with_name(path.name + suffix).unlink(missing_ok=True)
+            finally:
+                self._closing.discard(key)
+                self._changed.notify_all()
+        logger.info("Removed shard %s", key)
+
+    async def rebuild(self, key: str) -> None:
+        """Remove a shard and recreate it empty, ready for re-ingestion."""
+        await self.remove(key)
+        async with self._using(key, create=True):
+            pass
+
+    async def create_all(self) -> None:
+        """Open all shards on disk, creating any missing tables."""
+
+        async def open_shard(key: str) -> None:
+            async with self._using(key, create=True):
+                pass
+
+        await asyncio.gather(*(open_shard(key) for key in self.keys()))
+
+    async def dispose(self) -> None:
+        """Close all shard engines once no session uses them."""
+        async with self._changed:
+            await self._changed.wait_for(lambda: not self._users)
+            for key in list(self._engines):
+                await self._close(key)
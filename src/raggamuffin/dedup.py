@@ -0,0 +1,334 @@
+"""MinHash/LSH near-duplicate detection for chunks.
+
+Quoted email threads, re-saved drafts and copied notes produce many
+near-identical chunks. At chunking time every chunk gets a MinHash signature
+of its character shingles, computed with vectorized NumPy hashing. The
+signatures of canonical chunks are split into bands and stored in the
+chunk_lsh_band table, so candidates for a new chunk are found with one
+indexed lookup per batch instead of comparing against every chunk.
+
+A chunk whose estimated Jaccard similarity to a canonical chunk reaches the
+threshold becomes an alias: its canonical_id points at the canonical chunk,
+it gets no embeddings of its own (embedding_id() resolves to the canonical
+chunk), and collapse_aliases() drops it from results. Aliases always point
+at a canonical chunk, never at another alias.
+
+The band layout follows from the configuration; after changing threshold,
+num_perm or false_negative_weight, rebuild_bands() re-indexes the stored
+signatures.
+"""
+
+import uuid
+from typing import Iterable, Sequence, TypeVar
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from pydantic import BaseModel, Field
+from sqlalchemy import case, delete, func, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col, select
+
+from raggamuffin.models import ChunkLSHBandTable, ChunkTable
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+T = TypeVar("T", bound=ChunkTable)
+
+
+class DedupConfig(BaseModel):
+    """Configuration for near-duplicate detection."""
+
+    # Estimated Jaccard similarity from which a chunk becomes an alias
+    threshold: float = Field(default=0.85, gt=0, le=1)
+    # Signature length; more permutations give better estimates
+    num_perm: int = Field(default=128, ge=8)
+    # Characters per shingle
+    shingle_size: int = Field(default=5, ge=1)
+    # Weight of missed near-duplicates against spurious candidates when
+    # choosing the LSH bands; candidates are verified, so misses cost more
+    false_negative_weight: float = Field(default=0.95, gt=0, lt=1)
+    seed: int = 1
+
+
+class DedupReport(BaseModel):
+    """How much embedding work near-duplicate detection saved."""
+
+    chunks: int = 0
+    aliases: int = 0
+    characters: int = 0
+    characters_saved: int = 0
+
+    @property
+    def saved_ratio(self) -> float:
+        """Fraction of chunk text that needs no embedding."""
+        return self.characters_saved / self.characters if self.characters else 0.0
+
+
+def optimal_bands(
+    threshold: float, num_perm: int, false_negative_weight: float = 0.95
+) -> tuple[int, int]:
+    """(bands, rows) with bands * rows <= num_perm minimizing the weighted
+    false positive and false negative areas under the LSH S-curve.
+
+    A pair with similarity s becomes a candidate with probability
+    1 - (1 - s ** rows) ** bands. Placing the inflection point of that curve
+    at the threshold would find only about half of the pairs right at the
+    threshold; weighting false negatives moves it below.
+    """
+    similarity = np.linspace(0, 1, 1001)
+    above = similarity >= threshold
+    best, best_cost = (1, num_perm), np.inf
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            probability = 1 - (1 - similarity**rows) ** bands
+            false_positive = np.trapezoid(np.where(above, 0, probability), similarity)
+            false_negative = np.trapezoid(
+                np.where(above, 1 - probability, 0), similarity
+            )
+            cost = (
+                1 - false_negative_weight
+            ) * false_positive + false_negative_weight * false_negative
+            if cost < best_cost:
+                best, best_cost = (bands, rows), cost
+    return best
+
+
+def embedding_id(chunk: ChunkTable) -> uuid.UUID:
+    """Id of the chunk holding the embeddings for chunk."""
+    return chunk.canonical_id or chunk.id
+
+
+def collapse_aliases(chunks: Iterable[T]) -> list[T]:
+    """Keep only the first chunk of each canonical group, in order."""
+    seen: set[uuid.UUID] = set()
+    collapsed: list[T] = []
+    for chunk in chunks:
+        key = embedding_id(chunk)
+        if key not in seen:
+            seen.add(key)
+            collapsed.append(chunk)
+    return collapsed
+
+
+class NearDuplicateDetector:
+    """Assign MinHash signatures to chunks and mark near-duplicates as aliases."""
+
+    config: DedupConfig
+
+    def __init__(self, config: DedupConfig | None = None):
+        self.config = config or DedupConfig()
+        self.bands, self.rows = optimal_bands(
+            self.config.threshold,
+            self.config.num_perm,
+            self.config.false_negative_weight,
+        )
+
+        rng = np.random.default_rng(self.config.seed)
+        # Permutations h -> (a * h + b) mod p, as in the classic MinHash scheme
+        self._a = rng.integers(1, MERSENNE_PRIME, self.config.num_perm, np.uint64)
+        self._b = rng.integers(0, MERSENNE_PRIME, self.config.num_perm, np.uint64)
+        # Polynomial rolling hash weights for shingles
+        self._powers = rng.integers(1, 1 << 63, self.config.shingle_size, np.uint64)
+        # Weights for hashing a band's rows into one bucket key
+        self._band_mix = rng.integers(1, 1 << 63, self.rows, np.uint64) | np.uint64(1)
+
+    def shingles(self, text: str) -> np.ndarray:
+        """Unique 32-bit hashes of the text's character shingles."""
+        normalized = " ".join(text.casefold().split())
+        codes = np.frombuffer(normalized.encode("utf-32-le"), dtype=np.uint32)
+        size = min(self.config.shingle_size, len(codes))
+        if size == 0:
+            return np.zeros(1, dtype=np.uint64)
+
+        windows = sliding_window_view(codes.astype(np.uint64), size)
+        # uint64 arithmetic wraps around, which is fine for hashing
+        hashes = (windows * self._powers[:size]).sum(axis=1, dtype=np.uint64)
+        return np.unique((hashes ^ (hashes >> np.uint64(32))) & MAX_HASH)
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature (num_perm uint32 values) of a text."""
+        shingles = self.shingles(text)
+        permuted = (np.outer(shingles, self._a) + self._b) % MERSENNE_PRIME
+        return (permuted & MAX_HASH).min(axis=0).astype(np.uint32)
+
+    def band_keys(self, signature: np.ndarray) -> np.ndarray:
+        """One signed 64-bit bucket key per band (fits an SQLite INTEGER)."""
+        bands = signature[: self.bands * self.rows].reshape(self.bands, self.rows)
+        keys = (bands.astype(np.uint64) * self._band_mix).sum(axis=1, dtype=np.uint64)
+        return keys.view(np.int64)
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """Estimated Jaccard similarity of two signatures."""
+        return float(np.mean(a == b))
+
+    async def assign(
+        self, session: AsyncSession, chunks: Sequence[ChunkTable]
+    ) -> DedupReport:
+        """Sign chunks and alias near-duplicates, before they are embedded.
+
+        Chunks are compared against canonical chunks in the database and
+        earlier chunks of the same batch. Band rows for new canonical chunks
+        are added to the session; the caller commits.
+
+        Chunks may be assigned again (e.g. after their text changed): their
+        own band rows are replaced, and they are never matched against the
+        state stored for them before. A chunk that was canonical and becomes
+        an alias hands its aliases over to its own canonical chunk.
+        """
+        report = DedupReport()
+        signatures = [self.signature(chunk.text) for chunk in chunks]
+        keys = [self.band_keys(signature) for signature in signatures]
+        batch_ids = {chunk.id for chunk in chunks}
+
+        # One lookup for all candidate buckets of the batch
+        wanted = {
+            (band, int(key))
+            for chunk_keys in keys
+            for band, key in enumerate(chunk_keys)
+        }
+        buckets: dict[tuple[int, int], list[uuid.UUID]] = {}
+        candidate_signatures: dict[uuid.UUID, np.ndarray] = {}
+        # Canonical chunk of each candidate, for candidates that are aliases
+        roots: dict[uuid.UUID, uuid.UUID] = {}
+        if wanted:
+            result = await session.execute(
+                select(
+                    ChunkLSHBandTable.band,
+                    ChunkLSHBandTable.bucket,
+                    ChunkLSHBandTable.chunk_id,
+                ).where(
+                    tuple_(
+                        col(ChunkLSHBandTable.band), col(ChunkLSHBandTable.bucket)
+                    ).in_(wanted)
+                )
+            )
+            for band, bucket, chunk_id in result.all():
+                if chunk_id not in batch_ids:
+                    buckets.setdefault((band, bucket), []).append(chunk_id)
+
+            candidate_ids = {id for ids in buckets.values() for id in ids}
+            if candidate_ids:
+                result = await session.execute(
+                    select(
+                        ChunkTable.id, ChunkTable.minhash, ChunkTable.canonical_id
+                    ).where(col(ChunkTable.id).in_(candidate_ids))
+                )
+                for chunk_id, minhash, canonical_id in result.all():
+                    if minhash is not None:
+                        candidate_signatures[chunk_id] = np.frombuffer(
+                            minhash, dtype=np.uint32
+                        )
+                    if canonical_id is not None:
+                        roots[chunk_id] = canonical_id
+
+        # Band rows of chunks assigned before; re-added below if canonical
+        await session.execute(
+            delete(ChunkLSHBandTable)
+            .where(col(ChunkLSHBandTable.chunk_id).in_(batch_ids))
+            .execution_options(synchronize_session=False)
+        )
+
+        # Aliases of batch chunks that became aliases themselves
+        handovers: dict[uuid.UUID, uuid.UUID] = {}
+        for chunk, signature, chunk_keys in zip(chunks, signatures, keys):
+            chunk.minhash = signature.tobytes()
+            report.chunks += 1
+            report.characters += len(chunk.text)
+
+            candidates = {
+                id
+                for band, key in enumerate(chunk_keys)
+                for id in buckets.get((band, int(key)), ())
+                if id != chunk.id
+            }
+            best_id, best = None, 0.0
+            for candidate_id in candidates:
+                candidate = candidate_signatures.get(candidate_id)
+                if candidate is None:
+                    # Band rows of a deleted chunk (until compaction), or of
+                    # a chunk without a signature
+                    continue
+                similarity = self.similarity(signature, candidate)
+                if similarity > best:
+                    best_id, best = candidate_id, similarity
+
+            if best_id is not None:
+                best_id = roots.get(best_id, best_id)
+            if best_id not in (None, chunk.id) and best >= self.config.threshold:
+                chunk.canonical_id = best_id
+                handovers[chunk.id] = best_id
+                chunk.dense_embedding = None
+                chunk.sparse_embedding = None
+                report.aliases += 1
+                report.characters_saved += len(chunk.text)
+                continue
+
+            # New canonical chunk: index its bands, also for the rest of the batch
+            chunk.canonical_id = None
+            candidate_signatures[chunk.id] = signature
+            for band, key in enumerate(chunk_keys):
+                buckets.setdefault((band, int(key)), []).append(chunk.id)
+                session.add(
+                    ChunkLSHBandTable(band=band, bucket=int(key), chunk_id=chunk.id)
+                )
+
+        if handovers:
+            await session.execute(
+                update(ChunkTable)
+                .where(col(ChunkTable.canonical_id).in_(handovers))
+                .values(
+                    canonical_id=case(handovers, value=col(ChunkTable.canonical_id))
+                )
+                .execution_options(synchronize_session=False)
+            )
+
+        return report
+
+    async def rebuild_bands(self, session: AsyncSession, batch_size: int = 1000) -> int:
+        """Re-index the stored signatures of canonical chunks with this
+        detector's band layout; returns the number of chunks indexed.
+
+        The caller commits.
+        """
+        await session.execute(delete(ChunkLSHBandTable))
+        result = await session.stream(
+            select(ChunkTable.id, ChunkTable.minhash).where(
+                col(ChunkTable.canonical_id).is_(None),
+                col(ChunkTable.minhash).is_not(None),
+            )
+        )
+        count = 0
+        async for rows in result.partitions(batch_size):
+            session.add_all(
+                ChunkLSHBandTable(band=band, bucket=int(key), chunk_id=chunk_id)
+                for chunk_id, minhash in rows
+                for band, key in enumerate(
+                    self.band_keys(np.frombuffer(minhash, dtype=np.uint32))
+                )
+            )
+            await session.flush()
+            count += len(rows)
+        return count
+
+
+async def dedup_report(session: AsyncSession) -> DedupReport:
+    """Embedding work saved by aliases across all stored chunks."""
+    text_length = func.coalesce(func.sum(func.length(ChunkTable.text)), 0)
+    alias = col(ChunkTable.canonical_id).is_not(None)
+
+    chunks, characters = (
+        await session.execute(select(func.count(), text_length).select_from(ChunkTable))
+    ).one()
+    aliases, characters_saved = (
+        await session.execute(
+            select(func.count(), text_length).select_from(ChunkTable).where(alias)
+        )
+    ).one()
+    return DedupReport(
+        chunks=chunks,
+        aliases=aliases,
+        characters=characters,
+        characters_saved=characters_saved,
+    )
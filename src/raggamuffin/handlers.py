@@ -1,14 +1,31 @@
 """Document handlers for loading documents from various sources."""
 
 import logging
-from pathlib import Path
-from typing import Iterable
+from fnmatch import fnmatch
+from pathlib import Path, PurePath
+from typing import Iterable, Optional, Sequence
 
 from raggamuffin.models import DocumentTable, TextDocumentTable
 
 logger = logging.getLogger(__name__)
 
 
+def _match_parts(parts: Sequence[str], patterns: Sequence[str]) -> bool:
+    """Whether path parts match glob pattern parts the way Path.glob() does.
+
+    "**" stands for zero or more directories, or, as the last part, for
+    everything below; other parts match a single name with fnmatch.
+    """
+    if not patterns:
+        return not parts
+    pattern, rest = patterns[0], patterns[1:]
+    if pattern == "**":
+        if not rest:
+            return bool(parts)
+        return any(_match_parts(parts[i:], rest) for i in range(len(parts)))
+    return bool(parts) and fnmatch(parts[0], pattern) and _match_parts(parts[1:], rest)
+
+
 class DocumentHandler:
     """Handler for loading text documents from a directory.
 
@@ -25,6 +42,47 @@ class DocumentHandler:
         self.path = path
         self.glob = glob
 
+    def matches(self, file_path: Path) -> bool:
+        """Whether file_path falls under this handler's path and glob."""
+        try:
+            relative = PurePath(file_path).relative_to(self.path)
+        except ValueError:
+            return False
+
+        # Not PurePath.match(): it matches from the right, so "*.txt" would
+        # accept nested files, and it has no notion of "**" before 3.13.
+        return _match_parts(relative.parts, PurePath(self.glob).parts)
+
+    def read_text(self, file_path: Path) -> Optional[str]:
+        """Text of a file, or None if it cannot be decoded."""
+        try:
+            return file_path.read_text()
+        except UnicodeDecodeError as e:
+            logger.warning("Skipping %s due to %s", file_path, e)
+            return None
+
+    def get_document(
+        self, file_path: Path
+    ) -> Optional[tuple[DocumentTable, TextDocumentTable]]:
+        """Return the document pair for a single file, if it can be loaded.
+
+        Note: The document doesn't have its source set - the caller must
+        create appropriate SourceType and Source records first.
+        """
+        text = self.read_text(file_path)
+        if text is None:
+            return None
+
+        # TODO: Full implementation needs source handling
+        # Create base document (source_id must be set by caller)
+        # doc = DocumentTable(type="text_document", ...)
+        # text_doc = TextDocumentTable(id=doc.id, text=text)
+        # return (doc, text_doc)
+
+        # For now, just log
+        logger.info("Would create document from: %s (%d chars)", file_path, len(text))
+        return None
+
     def get_documents(self) -> Iterable[tuple[DocumentTable, TextDocumentTable]]:
         """Return iterator of document pairs (base + text) found.
 
@@ -32,23 +90,6 @@ class DocumentHandler:
         create appropriate SourceType and Source records first.
         """
         for file_path in self.path.glob(self.glob):
-            try:
-                text = file_path.read_text()
-            except UnicodeDecodeError as e:
-                logger.warning("Skipping %s due to %e", file_path, e)
-                continue
-
-            # TODO: Full implementation needs source handling
-            # Create base document (source_id must be set by caller)
-            # doc = DocumentTable(type="text_document", ...)
-            # text_doc = TextDocumentTable(id=doc.id, text=text)
-            # yield (doc, text_doc)
-
-            # For now, just log
-            logger.info(
-                "Would create document from: %s (%d chars)", file_path, len(text)
-            )
-
-        # Empty generator - no documents yielded until source handling is implemented
-        return
-        yield  # type: ignore[misc]  # Makes this a generator function
+            document = self.get_document(file_path)
+            if document is not None:
+                yield document
@@ -0,0 +1,19 @@
+"""Importers for external data sources.
+
+Re-exports importers for convenient imports:
+    from raggamuffin.importers import MailImporter, TelegramImporter
+"""
+
+from raggamuffin.importers.base import BatchWriter, EntityCache, ImportStats
+from raggamuffin.importers.mail import MailImporter
+from raggamuffin.importers.telegram import TelegramImporter
+
+__all__ = [
+    # Base
+    "BatchWriter",
+    "EntityCache",
+    "ImportStats",
+    # Importers
+    "MailImporter",
+    "TelegramImporter",
+]
@@ -0,0 +1,306 @@
+"""Shared building blocks for importers.
+
+Importers stream items from an external source and write them through a
+BatchWriter: rows are buffered per table and inserted with one executemany
+per table and batch, in foreign key order. Each flush is a single write
+operation on the Store's write actor (see store.py), in one transaction that
+also stores the importer's resume watermark and bumps the source's index
+generation, so a crash never leaves a watermark ahead of the data. Lookups
+(watermarks, known ids) go through the Store's read-only pool.
+"""
+
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Mapping, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import Executable, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import SQLModel, col, select
+
+from raggamuffin.cache import bump_generation, index_generation
+from raggamuffin.metadata import declared_keys, metadata_rows
+from raggamuffin.models import (
+    DocumentCreatorLink,
+    DocumentMetadataTable,
+    DocumentSetDocumentLink,
+    DocumentSetTable,
+    DocumentTable,
+    EntityIdentifierTable,
+    EntitySourceLink,
+    EntityTable,
+    ImageTable,
+    ImportStateTable,
+    MessageRecipientLink,
+    MessageTable,
+    SourceTable,
+    SourceTypeTable,
+    TextDocumentTable,
+)
+from raggamuffin.store import Store
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+# Binary data (e.g. image bytes) buffered before a batch is flushed early
+DEFAULT_BATCH_BYTES = 64 * 1024 * 1024
+
+# Insert order satisfying foreign keys between the tables importers write.
+TABLE_ORDER: list[type[SQLModel]] = [
+    EntityTable,
+    EntityIdentifierTable,
+    EntitySourceLink,
+    DocumentTable,
+    DocumentMetadataTable,
+    TextDocumentTable,
+    MessageTable,
+    MessageRecipientLink,
+    ImageTable,
+    DocumentCreatorLink,
+    DocumentSetTable,
+    DocumentSetDocumentLink,
+]
+
+
+class ImportStats(BaseModel):
+    """Counters reported by an importer run."""
+
+    documents: int = 0
+    entities: int = 0
+    skipped: int = 0
+    errors: int = 0
+    batches: int = 0
+
+
+async def get_or_create_source(store: Store, slug: str, uri: str) -> SourceTable:
+    """Return the source identified by uri, creating it (and its type)."""
+    async with store.read() as session:
+        result = await session.execute(
+            select(SourceTable).where(SourceTable.uri == uri)
+        )
+        source = result.scalars().first()
+    if source is not None:
+        return source
+
+    async def create(session: AsyncSession) -> SourceTable:
+        # Checked again: another writer may have created it meanwhile
+        result = await session.execute(
+            select(SourceTable).where(SourceTable.uri == uri)
+        )
+        source = result.scalars().first()
+        if source is not None:
+            return source
+
+        result = await session.execute(
+            select(SourceTypeTable).where(SourceTypeTable.slug == slug)
+        )
+        source_type = result.scalars().first()
+        if source_type is None:
+            source_type = SourceTypeTable(slug=slug)
+            session.add(source_type)
+            await session.flush()
+
+        source = SourceTable(source_type_id=source_type.id, uri=uri)
+        session.add(source)
+        await session.flush()
+        return source
+
+    return await store.write(create)
+
+
+async def get_watermark(
+    session: AsyncSession, source_id: uuid.UUID, key: str
+) -> Optional[str]:
+    state = await session.get(ImportStateTable, (source_id, key))
+    return state.value if state is not None else None
+
+
+async def existing_external_ids(
+    session: AsyncSession, source_id: uuid.UUID, external_ids: list[str]
+) -> set[str]:
+    """Subset of external_ids already imported for a source."""
+    if not external_ids:
+        return set()
+    result = await session.execute(
+        select(DocumentTable.external_id).where(
+            DocumentTable.source_id == source_id,
+            col(DocumentTable.external_id).in_(external_ids),
+        )
+    )
+    return {external_id for (external_id,) in result.all()}
+
+
+class EntityCache:
+    """In-memory (scheme, identifier) -> entity id map.
+
+    Loaded once per scheme from entity_identifier; entities for unseen
+    identifiers are created through the BatchWriter and cached right away,
+    so each identifier costs at most one insert per import.
+    """
+
+    def __init__(self) -> None:
+        self._ids: dict[tuple[str, str], uuid.UUID] = {}
+        self._loaded: set[str] = set()
+
+    async def load(self, session: AsyncSession, scheme: str) -> None:
+        if scheme in self._loaded:
+            return
+        result = await session.execute(
+            select(EntityIdentifierTable.value, EntityIdentifierTable.entity_id).where(
+                EntityIdentifierTable.scheme == scheme
+            )
+        )
+        for value, entity_id in result.all():
+            self._ids[(scheme, value)] = entity_id
+        self._loaded.add(scheme)
+
+    def resolve(
+        self,
+        writer: "BatchWriter",
+        scheme: str,
+        value: str,
+        name: str,
+        type: str = "person",
+    ) -> uuid.UUID:
+        """Entity id for an identifier, queueing a new entity if unknown."""
+        key = (scheme, value)
+        entity_id = self._ids.get(key)
+        if entity_id is None:
+            entity_id = uuid.uuid4()
+            now = datetime.now(timezone.utc)
+            writer.add(
+                EntityTable,
+                id=entity_id,
+                type=type,
+                name=name,
+                created=now,
+                modified=now,
+            )
+            writer.add(
+                EntityIdentifierTable, scheme=scheme, value=value, entity_id=entity_id
+            )
+            writer.add(
+                EntitySourceLink, entity_id=entity_id, source_id=writer.source_id
+            )
+            writer.stats.entities += 1
+            self._ids[key] = entity_id
+        return entity_id
+
+
+class BatchWriter:
+    """Buffer rows per table and write them in batched transactions.
+
+    A batch is written once it holds batch_size documents, or earlier when
+    the binary values buffered pass batch_bytes, so rows carrying blobs do
+    not pile up in memory.
+    """
+
+    def __init__(
+        self,
+        store: Store,
+        source_id: uuid.UUID,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        batch_bytes: int = DEFAULT_BATCH_BYTES,
+    ):
+        self.store = store
+        self.source_id = source_id
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.stats = ImportStats()
+        self._rows: dict[type[SQLModel], list[dict[str, Any]]] = {}
+        # Metadata of queued documents, materialized for declared keys on flush
+        self._metadata: list[tuple[uuid.UUID, Mapping[str, Any]]] = []
+        self._documents = 0
+        self._bytes = 0
+        self._watermarks: dict[str, str] = {}
+        self._statements: list[Executable] = []
+
+    def add(self, table: type[SQLModel], **row: Any) -> None:
+        self._rows.setdefault(table, []).append(row)
+        self._bytes += sum(
+            len(value) for value in row.values() if isinstance(value, bytes)
+        )
+
+    def add_document(self, **row: Any) -> uuid.UUID:
+        """Queue a document row for this writer's source; returns its id."""
+        row.setdefault("id", uuid.uuid4())
+        row.setdefault("created", datetime.now(timezone.utc))
+        row.setdefault("modified", row["created"])
+        self.add(DocumentTable, source_id=self.source_id, **row)
+        if row.get("metadata_json"):
+            self._metadata.append((row["id"], row["metadata_json"]))
+        self._documents += 1
+        return row["id"]
+
+    def add_statement(self, statement: Executable) -> None:
+        """Statement to execute after the inserts of the next flush."""
+        self._statements.append(statement)
+
+    def set_watermark(self, key: str, value: str) -> None:
+        """Resume point to store together with the next flush."""
+        self._watermarks[key] = value
+
+    @property
+    def full(self) -> bool:
+        return self._documents >= self.batch_size or self._bytes >= self.batch_bytes
+
+    async def _write(self, session: AsyncSession) -> Optional[int]:
+        """Write operation for the buffered batch; returns the new generation.
+
+        Runs on the write actor, which commits; it may run more than once
+        (see WriteActor), so it leaves the buffers untouched.
+        """
+        rows = dict(self._rows)
+        if self._metadata:
+            # Read on every flush: keys may be declared while an import runs
+            keys = await declared_keys(session)
+            rows[DocumentMetadataTable] = [
+                row
+                for document_id, metadata in self._metadata
+                for row in metadata_rows(document_id, metadata, keys)
+            ]
+
+        for table in TABLE_ORDER:
+            if rows.get(table):
+                await session.execute(insert(table), rows[table])
+
+        for statement in self._statements:
+            await session.execute(statement)
+
+        for key, value in self._watermarks.items():
+            await session.merge(
+                ImportStateTable(source_id=self.source_id, key=key, value=value)
+            )
+
+        if self._documents:
+            return await bump_generation(session, self.source_id)
+        return None
+
+    async def flush(self) -> None:
+        """Insert all buffered rows and watermarks in one transaction."""
+        if not (self._documents or self._watermarks or self._rows or self._statements):
+            return
+
+        generation = await self.store.write(self._write)
+
+        if generation is not None:
+            # Only now can readers see the rows of this generation
+            index_generation.bump(self.source_id, generation)
+            self.stats.documents += self._documents
+            self.stats.batches += 1
+            logger.info(
+                "Wrote batch of %d documents (%d total)",
+                self._documents,
+                self.stats.documents,
+            )
+        self._rows.clear()
+        self._metadata.clear()
+        self._statements.clear()
+        self._watermarks.clear()
+        self._documents = 0
+        self._bytes = 0
+
+    async def maybe_flush(self) -> None:
+        if self.full:
+            await self.flush()
@@ -0,0 +1,159 @@
+"""Incremental JSON reader for documents too large for json.load.
+
+The reader walks a JSON document from a text stream while holding only
+the part it is currently looking at. Containers are entered with
+iter_object()/iter_array(), and any value small enough to keep is read
+whole with read_value() (built on json.JSONDecoder.raw_decode).
+
+Usage:
+    reader = JSONStreamReader(f)
+    for key in reader.iter_object():
+        if key == "messages":
+            for _ in reader.iter_array():
+                handle(reader.read_value())
+        else:
+            reader.skip_value()
+
+Every key or element yielded must be consumed (read, iterated or skipped)
+before advancing the iterator.
+"""
+
+import json
+from typing import Any, Iterator, TextIO
+
+WHITESPACE = " \t\n\r"
+NUMBER_CHARS = "0123456789+-.eE"
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class JSONStreamError(ValueError):
+    """Raised on malformed or truncated input."""
+
+
+class JSONStreamReader:
+    """Pull parser over a JSON text stream."""
+
+    def __init__(self, f: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self, size: int = 0) -> bool:
+        """Read at least chunk_size (or size) more characters."""
+        if self._eof:
+            return False
+        if self._pos > self._chunk_size:
+            # Drop the consumed prefix so the buffer stays small
+            self._buf = self._buf[self._pos :]
+            self._pos = 0
+        data = self._f.read(max(self._chunk_size, size))
+        if not data:
+            self._eof = True
+            return False
+        self._buf += data
+        return True
+
+    def _peek(self) -> str:
+        """Next non-whitespace character, without consuming it."""
+        while True:
+            buf = self._buf
+            pos = self._pos
+            while pos < len(buf) and buf[pos] in WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self._fill():
+                raise JSONStreamError("Unexpected end of input")
+
+    def _expect(self, char: str) -> None:
+        found = self._peek()
+        if found != char:
+            raise JSONStreamError(f"Expected {char!r}, found {found!r}")
+        self._pos += 1
+
+    def peek_type(self) -> str:
+        """'object', 'array' or 'scalar' for the next value."""
+        char = self._peek()
+        return {"{": "object", "[": "array"}.get(char, "scalar")
+
+    def read_value(self) -> Any:
+        """Read the next value completely."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError as e:
+                # Most likely the value continues past the buffer; grow it
+                # proportionally so long values are not re-decoded too often.
+                if not self._fill(len(self._buf) - self._pos):
+                    raise JSONStreamError(str(e)) from e
+                continue
+
+            # A number running up to the buffer end may be truncated ("-1." of
+            # "-1.5e10" decodes as -1), so only accept it once followed by a
+            # character that cannot continue it.
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                tail = end
+                while tail < len(self._buf) and self._buf[tail] in NUMBER_CHARS:
+                    tail += 1
+                if tail == len(self._buf) and self._fill():
+                    continue
+
+            self._pos = end
+            return value
+
+    def iter_object(self) -> Iterator[str]:
+        """Enter an object, yielding its keys; the caller consumes each value."""
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+
+        while True:
+            key = self.read_value()
+            if not isinstance(key, str):
+                raise JSONStreamError(f"Expected object key, found {key!r}")
+            self._expect(":")
+            yield key
+
+            char = self._peek()
+            self._pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise JSONStreamError(f"Expected ',' or '}}', found {char!r}")
+
+    def iter_array(self) -> Iterator[int]:
+        """Enter an array, yielding element indexes; the caller consumes each."""
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+
+        index = 0
+        while True:
+            yield index
+            index += 1
+
+            char = self._peek()
+            self._pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise JSONStreamError(f"Expected ',' or ']', found {char!r}")
+
+    def skip_value(self) -> None:
+        """Consume the next value without materializing containers."""
+        kind = self.peek_type()
+        if kind == "object":
+            for _ in self.iter_object():
+                self.skip_value()
+        elif kind == "array":
+            for _ in self.iter_array():
+                self.skip_value()
+        else:
+            self.read_value()
@@ -0,0 +1,353 @@
+"""Streaming mbox/Maildir importer.
+
+Messages are parsed one at a time with the stdlib email package and written
+in batches as MessageTable rows (joined over document and text_document).
+Senders and all To/Cc recipients are resolved to person entities through an
+in-memory address -> entity cache; recipients are linked to the message in
+message_recipient_link.
+
+Resuming:
+- mbox: the byte offset after the last imported message is stored, with the
+  file's identity and size, and the next run seeks straight to it. (The
+  stdlib mailbox.mbox indexes the whole file before yielding anything, so
+  mbox files are read sequentially here.) Mail clients rewrite mbox files
+  when they expunge messages, so the offset is only used if the file is
+  the same, has not shrunk and has a From_ line at the offset; otherwise
+  the file is read from the start again.
+- Maildir: messages are visited in mtime order and the mtime of the last
+  imported message is stored as watermark.
+In both cases Message-IDs already imported for the source are skipped, so
+re-reading around a watermark never creates duplicates.
+"""
+
+import email.policy
+import logging
+import mailbox
+import os
+import re
+import uuid
+from datetime import datetime, timezone
+from email.message import EmailMessage
+from email.parser import BytesParser
+from email.utils import getaddresses, parsedate_to_datetime
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional
+
+from raggamuffin.importers.base import (
+    DEFAULT_BATCH_SIZE,
+    BatchWriter,
+    EntityCache,
+    ImportStats,
+    existing_external_ids,
+    get_or_create_source,
+    get_watermark,
+)
+from raggamuffin.models import (
+    DocumentCreatorLink,
+    MessageRecipientLink,
+    MessageTable,
+    TextDocumentTable,
+)
+from raggamuffin.store import Store
+
+logger = logging.getLogger(__name__)
+
+SOURCE_TYPE = "mail"
+SCHEME = "email"
+UNDISCLOSED = "undisclosed-recipients"
+
+TAG_RE = re.compile(r"<[^>]+>")
+
+parser = BytesParser(policy=email.policy.default)
+
+
+class RawMessage(NamedTuple):
+    """A message's bytes with a stable key and its resume position."""
+
+    data: bytes
+    key: str
+    position: str
+
+
+def iter_mbox(path: Path, offset: int = 0) -> Iterator[RawMessage]:
+    """Yield messages from an mbox file, starting at byte offset.
+
+    Each key is the offset of the message's From_ line; each position is the
+    offset just past the message, i.e. where reading resumes once that
+    message has been imported.
+    """
+    with path.open("rb") as f:
+        f.seek(offset)
+        lines: list[bytes] = []
+        start = position = offset
+        previous_blank = True
+
+        for line in f:
+            if line.startswith(b"From ") and previous_blank:
+                if lines:
+                    yield RawMessage(b"".join(lines), str(start), str(position))
+                lines = []
+                start = position
+            else:
+                lines.append(line)
+            position += len(line)
+            previous_blank = line in (b"\n", b"\r\n")
+
+        if lines:
+            yield RawMessage(b"".join(lines), str(start), str(position))
+
+
+def mbox_identity(path: Path) -> str:
+    """Identity of the file at path; changes when the file is replaced."""
+    stat = path.stat()
+    return f"{stat.st_dev}:{stat.st_ino}"
+
+
+def can_resume_mbox(
+    path: Path, offset: int, identity: Optional[str], size: Optional[int]
+) -> bool:
+    """Whether reading path may resume at offset.
+
+    identity and size are those stored with the offset. The file must be the
+    same one, must not have shrunk, and offset must be its end or the start
+    of a From_ line.
+    """
+    stat = path.stat()
+    if identity != f"{stat.st_dev}:{stat.st_ino}" or size is None:
+        return False
+    if stat.st_size < size or offset > stat.st_size:
+        return False
+    if offset == stat.st_size:
+        return True
+    with path.open("rb") as f:
+        if offset:
+            # A From_ line starts right after a line break
+            f.seek(offset - 1)
+            if f.read(1) != b"\n":
+                return False
+        return f.read(5) == b"From "
+
+
+def iter_maildir(path: Path, since: float = 0.0) -> Iterator[RawMessage]:
+    """Yield Maildir messages modified at or after since, oldest first.
+
+    Only a listing of new/ and cur/ is held in memory; messages are read one
+    at a time.
+    """
+    entries: list[tuple[float, Path]] = []
+    for subdir in ("new", "cur"):
+        directory = path / subdir
+        if not directory.is_dir():
+            continue
+        for entry in os.scandir(directory):
+            if entry.name.startswith(".") or not entry.is_file():
+                continue
+            mtime = entry.stat().st_mtime
+            if mtime >= since:
+                entries.append((mtime, Path(entry.path)))
+
+    for mtime, file_path in sorted(entries):
+        try:
+            data = file_path.read_bytes()
+        except FileNotFoundError:
+            # Moved from new/ to cur/ (or deleted) by a mail client meanwhile
+            continue
+        # Unique part of the file name, without the ":2,<flags>" info suffix
+        key = file_path.name.split(mailbox.Maildir.colon, 1)[0]
+        yield RawMessage(data, key, repr(mtime))
+
+
+def _body_text(message: EmailMessage) -> str:
+    body = message.get_body(preferencelist=("plain", "html"))
+    if body is None:
+        return ""
+    try:
+        content = body.get_content()
+    except (LookupError, UnicodeError):
+        # Bytes for a leaf part; anything else (e.g. a broken multipart
+        # declared as text) has no text of its own
+        payload = body.get_payload(decode=True)
+        content = (
+            payload.decode("utf-8", "replace") if isinstance(payload, bytes) else ""
+        )
+    if body.get_content_subtype() == "html":
+        content = TAG_RE.sub(" ", content)
+    return content.strip()
+
+
+def _addresses(message: EmailMessage, *headers: str) -> list[tuple[str, str]]:
+    values = [str(v) for header in headers for v in message.get_all(header, [])]
+    return [
+        (name, address.lower())
+        for name, address in getaddresses(values)
+        if address and "@" in address
+    ]
+
+
+def _date(message: EmailMessage) -> Optional[datetime]:
+    date = message.get("Date")
+    if not date:
+        return None
+    try:
+        return parsedate_to_datetime(str(date))
+    except (TypeError, ValueError):
+        return None
+
+
+class MailImporter:
+    """Import an mbox file or Maildir directory into a source."""
+
+    path: Path
+    batch_size: int
+
+    def __init__(self, path: Path, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.entities = EntityCache()
+        # Watermarks stored with every position (mbox identity and size)
+        self._file_state: dict[str, str] = {}
+
+    @property
+    def is_maildir(self) -> bool:
+        return self.path.is_dir()
+
+    @property
+    def uri(self) -> str:
+        kind = "maildir" if self.is_maildir else "mbox"
+        return f"{kind}://{self.path.resolve()}"
+
+    def _messages(self, watermark: Optional[str]) -> Iterator[RawMessage]:
+        if self.is_maildir:
+            return iter_maildir(self.path, float(watermark) if watermark else 0.0)
+        return iter_mbox(self.path, int(watermark) if watermark else 0)
+
+    def _add_message(
+        self, writer: BatchWriter, message: EmailMessage, message_id: str
+    ) -> None:
+        senders = _addresses(message, "From", "Sender")
+        recipients = _addresses(message, "To", "Cc")
+        if not senders:
+            raise ValueError("No sender address")
+
+        sender_name, sender_address = senders[0]
+        sender_id = self.entities.resolve(
+            writer, SCHEME, sender_address, sender_name or sender_address
+        )
+        # Every addressee, keeping the first role of an address listed twice
+        recipient_ids: dict[uuid.UUID, str] = {}
+        for header in ("To", "Cc"):
+            for name, address in _addresses(message, header):
+                entity_id = self.entities.resolve(
+                    writer, SCHEME, address, name or address
+                )
+                recipient_ids.setdefault(entity_id, header.lower())
+        if not recipient_ids:
+            undisclosed_id = self.entities.resolve(
+                writer, SCHEME, UNDISCLOSED, UNDISCLOSED
+            )
+            recipient_ids[undisclosed_id] = "to"
+        recipient_id = next(iter(recipient_ids))
+
+        subject = str(message.get("Subject", "")).strip()
+        body = _body_text(message)
+        date = _date(message) or datetime.now(timezone.utc)
+        metadata: dict[str, str | int | float] = {
+            "subject": subject,
+            "from": sender_address,
+            "to": ", ".join(address for _, address in recipients),
+        }
+
+        document_id = writer.add_document(
+            type="message",
+            external_id=message_id,
+            metadata_json=metadata,
+            created=date,
+        )
+        writer.add(
+            TextDocumentTable,
+            id=document_id,
+            text=f"{subject}\n\n{body}" if subject else body,
+        )
+        writer.add(
+            MessageTable,
+            id=document_id,
+            event_date=date,
+            sender_id=sender_id,
+            recipient_id=recipient_id,
+            content=body,
+        )
+        for entity_id, role in recipient_ids.items():
+            writer.add(
+                MessageRecipientLink,
+                message_id=document_id,
+                recipient_id=entity_id,
+                role=role,
+            )
+        writer.add(DocumentCreatorLink, document_id=document_id, creator_id=sender_id)
+
+    async def _write_batch(
+        self, writer: BatchWriter, batch: list[tuple[RawMessage, EmailMessage, str]]
+    ) -> None:
+        async with writer.store.read() as session:
+            existing = await existing_external_ids(
+                session, writer.source_id, [message_id for *_, message_id in batch]
+            )
+        for raw, message, message_id in batch:
+            if message_id in existing:
+                writer.stats.skipped += 1
+            else:
+                try:
+                    self._add_message(writer, message, message_id)
+                except (ValueError, LookupError) as e:
+                    logger.warning("Skipping message %s: %s", message_id, e)
+                    writer.stats.errors += 1
+                existing.add(message_id)
+            writer.set_watermark("position", raw.position)
+        for key, value in self._file_state.items():
+            writer.set_watermark(key, value)
+        await writer.flush()
+
+    async def run(self, store: Store) -> ImportStats:
+        source = await get_or_create_source(store, SOURCE_TYPE, self.uri)
+        async with store.read() as session:
+            await self.entities.load(session, SCHEME)
+            watermark = await get_watermark(session, source.id, "position")
+            identity = await get_watermark(session, source.id, "file")
+            size = await get_watermark(session, source.id, "size")
+
+        self._file_state = {}
+        if not self.is_maildir:
+            if watermark is not None and not can_resume_mbox(
+                self.path, int(watermark), identity, int(size) if size else None
+            ):
+                logger.warning(
+                    "%s was rewritten since the last import, reading it again",
+                    self.path,
+                )
+                watermark = None
+            # Identity and size of the file as this run starts reading it
+            self._file_state = {
+                "file": mbox_identity(self.path),
+                "size": str(self.path.stat().st_size),
+            }
+        logger.info("Importing %s from position %s", self.uri, watermark or "start")
+
+        writer = BatchWriter(store, source.id, self.batch_size)
+        batch: list[tuple[RawMessage, EmailMessage, str]] = []
+
+        for raw in self._messages(watermark):
+            message = parser.parsebytes(raw.data)
+            assert isinstance(message, EmailMessage)
+            message_id = str(message.get("Message-ID", "")).strip()
+            if not message_id:
+                # Stable fallback id for messages without a Message-ID
+                message_id = f"<{raw.key}@{self.uri}>"
+
+            batch.append((raw, message, message_id))
+            if len(batch) >= self.batch_size:
+                await self._write_batch(writer, batch)
+                batch = []
+
+        await self._write_batch(writer, batch)
+        logger.info("Imported %s: %s", self.uri, writer.stats)
+        return writer.stats
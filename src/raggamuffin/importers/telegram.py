@@ -0,0 +1,409 @@
+"""Streaming importer for Telegram Desktop exports (result.json).
+
+Exports are single JSON documents that easily grow to several gigabytes,
+so they are walked with JSONStreamReader: only the message being imported
+and the current batch are held in memory, whatever the export size. Image
+bytes count against the BatchWriter's batch_bytes budget, so batches of
+photos are flushed before they add up.
+
+Mapping:
+- each chat becomes a conversation (DocumentSetTable, type="conversation");
+- each message becomes a MessageTable row linked into its conversation;
+- users become person entities through the cached ("telegram", "user<id>")
+  identifier map; group chats become "group" entities acting as recipient;
+- photos (and image files) become ImageTable documents in the conversation.
+
+Both full-account exports ({"chats": {"list": [...]}}) and single-chat
+exports ({"name": ..., "messages": [...]}) are supported. Re-imports resume
+per chat after the highest message id imported before, also when the export
+was moved (and so imports into a new source): conversations are shared.
+"""
+
+import itertools
+import logging
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator, Optional, TextIO
+
+from sqlalchemy import update
+from sqlmodel import col, func, select
+
+from raggamuffin.importers.base import (
+    DEFAULT_BATCH_BYTES,
+    DEFAULT_BATCH_SIZE,
+    BatchWriter,
+    EntityCache,
+    ImportStats,
+    get_or_create_source,
+    get_watermark,
+)
+from raggamuffin.importers.jsonstream import JSONStreamReader
+from raggamuffin.models import (
+    DocumentCreatorLink,
+    DocumentSetDocumentLink,
+    DocumentSetTable,
+    ImageTable,
+    MessageTable,
+    TextDocumentTable,
+)
+from raggamuffin.store import Store
+
+logger = logging.getLogger(__name__)
+
+SOURCE_TYPE = "telegram"
+SCHEME = "telegram"
+SELF = "self"
+
+# Chats between the exporting user and one other party
+DIRECT_CHAT_TYPES = {"personal_chat", "bot_chat", "saved_messages"}
+CHAT_KEYS = {"id", "name", "type"}
+
+# Don't pull huge media files into the database
+MAX_IMAGE_SIZE = 32 * 1024 * 1024
+
+Event = tuple[str, Any]
+
+
+# ============================================================================
+# Streaming
+# ============================================================================
+
+
+def _iter_chat(reader: JSONStreamReader, keys: Iterator[str]) -> Iterator[Event]:
+    """Events for one chat object, whose keys are being iterated."""
+    info: dict[str, Any] = {}
+    for key in keys:
+        if key in CHAT_KEYS:
+            info[key] = reader.read_value()
+        elif key == "messages":
+            # Telegram writes name/type/id before messages
+            yield ("chat", info)
+            for _ in reader.iter_array():
+                yield ("message", reader.read_value())
+        else:
+            reader.skip_value()
+    yield ("chat_end", info)
+
+
+def iter_export(f: TextIO) -> Iterator[Event]:
+    """Yield ("self", info), ("chat", info), ("message", message) and
+    ("chat_end", info) events from a Telegram export."""
+    reader = JSONStreamReader(f)
+    keys = reader.iter_object()
+    for key in keys:
+        if key == "personal_information":
+            yield ("self", reader.read_value())
+        elif key in ("chats", "left_chats"):
+            for section in reader.iter_object():
+                if section != "list":
+                    reader.skip_value()
+                    continue
+                for _ in reader.iter_array():
+                    yield from _iter_chat(reader, reader.iter_object())
+        elif key in CHAT_KEYS or key == "messages":
+            # Single-chat export: the document itself is the chat
+            yield from _iter_chat(reader, itertools.chain([key], keys))
+        else:
+            reader.skip_value()
+
+
+def _text(value: Any) -> str:
+    """Flatten Telegram's text field (a string or a list of entities)."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        return "".join(
+            part if isinstance(part, str) else str(part.get("text", ""))
+            for part in value
+        )
+    return ""
+
+
+def _utc(date: Optional[datetime]) -> Optional[datetime]:
+    # SQLite hands stored datetimes back without their offset
+    if date is not None and date.tzinfo is None:
+        return date.replace(tzinfo=timezone.utc)
+    return date
+
+
+def _date(message: dict[str, Any]) -> datetime:
+    if "date_unixtime" in message:
+        return datetime.fromtimestamp(int(message["date_unixtime"]), timezone.utc)
+    # Older exports only have local time without offset
+    return datetime.fromisoformat(message["date"]).replace(tzinfo=timezone.utc)
+
+
+# ============================================================================
+# Importer
+# ============================================================================
+
+
+class ChatState:
+    """Per-chat bookkeeping while its messages are imported."""
+
+    def __init__(
+        self,
+        key: str,
+        name: str,
+        type: str,
+        conversation_id: uuid.UUID,
+        entity_id: Optional[uuid.UUID],
+        last_message_id: int,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+    ):
+        self.key = key
+        self.name = name
+        self.type = type
+        self.conversation_id = conversation_id
+        self.entity_id = entity_id
+        self.last_message_id = last_message_id
+        self.start_date = start_date
+        self.end_date = end_date
+        self.changed = False
+
+    def seen(self, date: datetime) -> None:
+        self.start_date = min(self.start_date or date, date)
+        self.end_date = max(self.end_date or date, date)
+        self.changed = True
+
+
+class TelegramImporter:
+    """Import a Telegram Desktop JSON export into a source."""
+
+    path: Path
+    batch_size: int
+    batch_bytes: int
+
+    def __init__(
+        self,
+        path: Path,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        batch_bytes: int = DEFAULT_BATCH_BYTES,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.entities = EntityCache()
+        self.self_key = SELF
+
+    @property
+    def uri(self) -> str:
+        return f"telegram://{self.path.resolve()}"
+
+    async def _start_chat(self, writer: BatchWriter, info: dict[str, Any]) -> ChatState:
+        key = f"chat{info.get('id', '')}"
+        name = str(info.get("name") or key)
+        type = str(info.get("type", ""))
+        external_id = f"{SCHEME}:{key}"
+
+        async with writer.store.read() as session:
+            result = await session.execute(
+                select(DocumentSetTable).where(
+                    DocumentSetTable.external_id == external_id
+                )
+            )
+            conversation = result.scalars().first()
+            watermark = await get_watermark(session, writer.source_id, key)
+            last_message_id = int(watermark) if watermark else 0
+            if conversation is not None:
+                # Messages may have come from a copy of the export at another
+                # path, whose watermarks belong to another source
+                result = await session.execute(
+                    select(func.max(DocumentSetDocumentLink.order)).where(
+                        col(DocumentSetDocumentLink.document_set_id) == conversation.id
+                    )
+                )
+                last_message_id = max(last_message_id, result.scalar_one() or 0)
+        if conversation is None:
+            conversation = DocumentSetTable(
+                type="conversation", external_id=external_id
+            )
+            writer.add(
+                DocumentSetTable,
+                id=conversation.id,
+                type=conversation.type,
+                external_id=external_id,
+            )
+
+        entity_id = None
+        if type not in DIRECT_CHAT_TYPES:
+            # Messages in groups and channels are addressed to the chat itself
+            entity_id = self.entities.resolve(writer, SCHEME, key, name, type="group")
+
+        return ChatState(
+            key=key,
+            name=name,
+            type=type,
+            conversation_id=conversation.id,
+            entity_id=entity_id,
+            last_message_id=last_message_id,
+            start_date=_utc(conversation.start_date),
+            end_date=_utc(conversation.end_date),
+        )
+
+    def _end_chat(self, writer: BatchWriter, chat: ChatState) -> None:
+        if chat.changed:
+            writer.add_statement(
+                update(DocumentSetTable)
+                .where(DocumentSetTable.id == chat.conversation_id)  # type: ignore[arg-type]
+                .values(start_date=chat.start_date, end_date=chat.end_date)
+            )
+
+    def _recipient(
+        self, writer: BatchWriter, chat: ChatState, from_id: str
+    ) -> uuid.UUID:
+        if chat.entity_id is not None:
+            return chat.entity_id
+
+        # Direct chats share their id with the other party's user id
+        other = f"user{chat.key.removeprefix('chat')}"
+        if from_id == other:
+            return self.entities.resolve(writer, SCHEME, self.self_key, self.self_key)
+        return self.entities.resolve(writer, SCHEME, other, chat.name)
+
+    def _add_image(
+        self,
+        writer: BatchWriter,
+        chat: ChatState,
+        message: dict[str, Any],
+        relative_path: str,
+        external_id: str,
+        date: datetime,
+    ) -> None:
+        file_path = self.path.parent / relative_path
+        data = b""
+        try:
+            if file_path.stat().st_size <= MAX_IMAGE_SIZE:
+                data = file_path.read_bytes()
+        except OSError:
+            # Media not included in the export ("(File not included. ...)")
+            pass
+
+        image_id = writer.add_document(
+            type="image",
+            external_id=f"{external_id}/image",
+            metadata_json={"path": relative_path, "message": external_id},
+            created=date,
+        )
+        writer.add(
+            ImageTable,
+            id=image_id,
+            width=message.get("width"),
+            height=message.get("height"),
+            data=data,
+        )
+        writer.add(
+            DocumentSetDocumentLink,
+            document_set_id=chat.conversation_id,
+            document_id=image_id,
+            order=int(message["id"]),
+        )
+
+    def _add_message(
+        self, writer: BatchWriter, chat: ChatState, message: dict[str, Any]
+    ) -> None:
+        message_id = int(message.get("id", 0))
+        if message.get("type") != "message" or message_id <= chat.last_message_id:
+            # Service messages (joins, pins, ...) and already imported ones
+            writer.stats.skipped += 1
+            return
+
+        date = _date(message)
+        text = _text(message.get("text"))
+        image = message.get("photo")
+        if image is None and str(message.get("mime_type", "")).startswith("image/"):
+            image = message.get("file")
+
+        if not text and image is None:
+            writer.stats.skipped += 1
+            writer.set_watermark(chat.key, str(message_id))
+            return
+
+        from_id = str(message.get("from_id") or chat.key)
+        sender_id = self.entities.resolve(
+            writer, SCHEME, from_id, str(message.get("from") or from_id)
+        )
+        recipient_id = self._recipient(writer, chat, from_id)
+        external_id = f"{chat.key}/{message_id}"
+
+        metadata: dict[str, str | int | float] = {
+            "chat": chat.name,
+            "chat_id": chat.key,
+            "from": from_id,
+        }
+        for key in ("media_type", "mime_type", "reply_to_message_id"):
+            if key in message:
+                metadata[key] = message[key]
+
+        document_id = writer.add_document(
+            type="message",
+            external_id=external_id,
+            metadata_json=metadata,
+            created=date,
+        )
+        writer.add(TextDocumentTable, id=document_id, text=text)
+        writer.add(
+            MessageTable,
+            id=document_id,
+            event_date=date,
+            sender_id=sender_id,
+            recipient_id=recipient_id,
+            content=text,
+        )
+        writer.add(DocumentCreatorLink, document_id=document_id, creator_id=sender_id)
+        writer.add(
+            DocumentSetDocumentLink,
+            document_set_id=chat.conversation_id,
+            document_id=document_id,
+            order=message_id,
+        )
+
+        if isinstance(image, str):
+            self._add_image(writer, chat, message, image, external_id, date)
+
+        chat.seen(date)
+        writer.set_watermark(chat.key, str(message_id))
+
+    async def run(self, store: Store) -> ImportStats:
+        source = await get_or_create_source(store, SOURCE_TYPE, self.uri)
+        async with store.read() as session:
+            await self.entities.load(session, SCHEME)
+        writer = BatchWriter(
+            store,
+            source.id,
+            self.batch_size,
+            batch_bytes=self.batch_bytes,
+        )
+        logger.info("Importing %s", self.uri)
+
+        chat: Optional[ChatState] = None
+        with self.path.open(encoding="utf-8") as f:
+            for event, value in iter_export(f):
+                if event == "self":
+                    self.self_key = f"user{value.get('user_id', '')}"
+                    name = " ".join(
+                        str(value[key])
+                        for key in ("first_name", "last_name")
+                        if value.get(key)
+                    )
+                    self.entities.resolve(
+                        writer, SCHEME, self.self_key, name or self.self_key
+                    )
+                elif event == "chat":
+                    chat = await self._start_chat(writer, value)
+                elif event == "message" and chat is not None:
+                    try:
+                        self._add_message(writer, chat, value)
+                    except (KeyError, TypeError, ValueError) as e:
+                        logger.warning("Skipping message in %s: %s", chat.key, e)
+                        writer.stats.errors += 1
+                    await writer.maybe_flush()
+                elif event == "chat_end" and chat is not None:
+                    self._end_chat(writer, chat)
+                    chat = None
+
+        await writer.flush()
+        logger.info("Imported %s: %s", self.uri, writer.stats)
+        return writer.stats
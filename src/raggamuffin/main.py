@@ -1,36 +1,205 @@
 """Main entry point for raggamuffin."""
 
+import argparse
 import asyncio
 import logging
+import os
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import AsyncIterator, Optional, Sequence
 
-from sqlalchemy.ext.asyncio import (
-    AsyncEngine,
-    async_sessionmaker,
-    create_async_engine,
-)
-from sqlmodel import SQLModel
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-# Import all models to ensure they're registered with SQLModel.metadata
-from raggamuffin import models  # noqa: F401
+from raggamuffin.backfill import BackfillScheduler
+from raggamuffin.compaction import (
+    CompactionConfig,
+    CompactionReport,
+    compact,
+    compact_periodically,
+)
+from raggamuffin.database import DEFAULT_DATABASE, ShardRouter, create_all, get_engine
 from raggamuffin.handlers import DocumentHandler
+from raggamuffin.importers import MailImporter, TelegramImporter
+from raggamuffin.importers.base import DEFAULT_BATCH_SIZE
+from raggamuffin.metadata import (
+    DEFAULT_BACKFILL_BATCH,
+    DEFAULT_KEYS,
+    backfill,
+    declare_keys,
+)
+from raggamuffin.store import Store
+from raggamuffin.watch import SOURCE_TYPE, WatchConfig, handler_ingest, watch
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 MAX_DOCS = 100
 
 
-def get_engine() -> AsyncEngine:
-    """Create async database engine."""
-    sqlite_file_name = "database.db"
-    sqlite_url = f"sqlite+aiosqlite:///{sqlite_file_name}"
+@asynccontextmanager
+async def open_session(
+    args: argparse.Namespace, shard: str
+) -> AsyncIterator[AsyncSession]:
+    """Session on the shard for a source type, or on the single database."""
+    if args.shards is not None:
+        router = ShardRouter(args.shards)
+        try:
+            async with router.session(shard) as session:
+                yield session
+        finally:
+            await router.dispose()
+        return
+
+    engine = get_engine(args.database, echo=False)
+    try:
+        await create_all(engine)
+        async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+            yield session
+    finally:
+        await engine.dispose()
+
+
+@asynccontextmanager
+async def open_store(args: argparse.Namespace, shard: str) -> AsyncIterator[Store]:
+    """Store (write actor and read pool) on the shard or single database."""
+    if args.shards is not None:
+        path = ShardRouter(args.shards).shard_path(shard)
+        path.parent.mkdir(parents=True, exist_ok=True)
+    else:
+        path = args.database
+
+    async with Store(path) as store:
+        yield store
+
+
+async def import_mail_main(args: argparse.Namespace) -> None:
+    """Import an mbox file or Maildir directory."""
+    importer = MailImporter(args.path, batch_size=args.batch_size)
+    async with open_store(args, "mail") as store:
+        await importer.run(store)
+
+
+async def import_telegram_main(args: argparse.Namespace) -> None:
+    """Import a Telegram Desktop JSON export."""
+    importer = TelegramImporter(args.path, batch_size=args.batch_size)
+    async with open_store(args, "telegram") as store:
+        await importer.run(store)
+
+
+async def index_metadata_main(args: argparse.Namespace) -> None:
+    """Declare indexed metadata keys and back-fill existing documents."""
+    shards = ShardRouter(args.shards).keys() if args.shards is not None else [""]
+    for shard in shards:
+        async with open_session(args, shard) as session:
+            await declare_keys(session, args.keys)
+            await backfill(session, batch_size=args.batch_size, pause=args.pause)
+
+
+async def backfill_status_main(args: argparse.Namespace) -> None:
+    """Print pending backfill work per task, with throughput and ETA."""
+    scheduler = BackfillScheduler({})
+    shards = ShardRouter(args.shards).keys() if args.shards is not None else [""]
+    for shard in shards:
+        async with open_session(args, shard) as session:
+            statuses = await scheduler.status(session)
+        if shard:
+            print(f"[{shard}]")
+        print(f"{'task':<30} {'pending':>10} {'done':>10} {'failed':>8} {'eta':>12}")
+        for status in statuses:
+            eta = "-" if status.eta is None else str(status.eta).split(".")[0]
+            print(
+                f"{status.task:<30} {status.pending:>10} {status.processed:>10} "
+                f"{status.failed:>8} {eta:>12}"
+            )
+
+
+def print_compaction_report(name: str, report: CompactionReport) -> None:
+    print(f"{name}: {report.rows_deleted} orphaned rows", end="")
+    print(f", {report.nullified} dangling references", end="")
+    print(f", {report.embeddings_cleared} alias embeddings")
+    for rule, count in sorted(report.deleted.items()):
+        print(f"  {rule:<40} {count:>10}")
+    print(
+        f"  {report.size_before:,} -> {report.size_after:,} bytes "
+        f"({report.reclaimed:,} reclaimed) in {report.seconds:.1f}s"
+    )
 
-    return create_async_engine(sqlite_url, echo=True)
 
+async def compact_main(args: argparse.Namespace) -> None:
+    """Delete orphaned rows, then vacuum and optimize the database(s)."""
+    config = CompactionConfig(
+        batch_size=args.batch_size,
+        pause=args.pause,
+        full_vacuum=args.full,
+        dry_run=args.dry_run,
+    )
+    if args.shards is not None:
+        router = ShardRouter(args.shards)
+        paths = [router.shard_path(key) for key in router.keys()]
+    else:
+        paths = [args.database]
 
-async def async_main() -> None:
+    engines = [get_engine(path, echo=False) for path in paths]
+    try:
+        if args.every is not None:
+            # Background job: runs until interrupted
+            await asyncio.gather(
+                *(compact_periodically(e, args.every, config) for e in engines)
+            )
+            return
+        for path, engine in zip(paths, engines):
+            await create_all(engine)
+            print_compaction_report(str(path), await compact(engine, config))
+    finally:
+        for engine in engines:
+            await engine.dispose()
+
+
+async def watch_main(args: argparse.Namespace) -> None:
+    """Watch a directory and ingest changed files until interrupted."""
+    handler = DocumentHandler(args.path, args.glob)
+    config = WatchConfig(
+        debounce=args.debounce,
+        max_files_per_second=args.rate,
+        poll_interval=args.poll_interval,
+        force_polling=args.poll,
+    )
+    if args.nice:
+        # Keep ingestion from competing with interactive work
+        os.nice(args.nice)
+    async with open_store(args, SOURCE_TYPE) as store:
+        await watch(handler, handler_ingest(handler, store), config)
+
+
+async def async_main(args: argparse.Namespace) -> None:
     """Main async entry point."""
-    engine = get_engine()
+    if args.command == "watch":
+        await watch_main(args)
+        return
+    if args.command == "import-mail":
+        await import_mail_main(args)
+        return
+    if args.command == "import-telegram":
+        await import_telegram_main(args)
+        return
+    if args.command == "index-metadata":
+        await index_metadata_main(args)
+        return
+    if args.command == "backfill-status":
+        await backfill_status_main(args)
+        return
+    if args.command == "compact":
+        await compact_main(args)
+        return
+
+    if args.shards is not None:
+        # Sharded layout: one SQLite file per source type, created on first write
+        router = ShardRouter(args.shards)
+        await router.create_all()
+        logger.info("Opened %d shards in %s", len(router.keys()), args.shards)
+        await router.dispose()
+        return
+
+    engine = get_engine(args.database)
 
     # async_sessionmaker: a factory for new AsyncSession objects.
     # expire_on_commit - don't expire objects after transaction commit
@@ -38,8 +207,7 @@ async def async_main() -> None:
     _ = async_sessionmaker(engine, expire_on_commit=False)
 
     # Create all tables from the models package
-    async with engine.begin() as conn:
-        await conn.run_sync(SQLModel.metadata.create_all)
+    await create_all(engine)
 
     logger.info("Database tables created")
 
@@ -64,6 +232,144 @@ async def async_main() -> None:
     await engine.dispose()
 
 
-def main() -> None:
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="raggamuffin")
+    storage = parser.add_mutually_exclusive_group()
+    storage.add_argument(
+        "--database",
+        type=Path,
+        default=Path(DEFAULT_DATABASE),
+        help="SQLite database file (default: %(default)s)",
+    )
+    storage.add_argument(
+        "--shards",
+        type=Path,
+        default=None,
+        metavar="DIR",
+        help="Use a sharded layout with one SQLite file per source type in DIR",
+    )
+
+    subparsers = parser.add_subparsers(dest="command")
+
+    watch_parser = subparsers.add_parser(
+        "watch", help="Watch a directory and ingest changed files"
+    )
+    watch_parser.add_argument("path", type=Path, nargs="?", default=Path.home())
+    watch_parser.add_argument("--glob", default="**/*.txt")
+    watch_parser.add_argument(
+        "--debounce",
+        type=float,
+        default=WatchConfig().debounce,
+        help="Seconds a file must be quiet before ingestion (default: %(default)s)",
+    )
+    watch_parser.add_argument(
+        "--rate",
+        type=float,
+        default=WatchConfig().max_files_per_second,
+        help="Maximum files ingested per second (default: %(default)s)",
+    )
+    watch_parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=WatchConfig().poll_interval,
+        help="Scan interval when polling (default: %(default)s)",
+    )
+    watch_parser.add_argument(
+        "--poll", action="store_true", help="Poll even if inotify is available"
+    )
+    watch_parser.add_argument(
+        "--nice",
+        type=int,
+        default=10,
+        help="Niceness increment for the watch process (default: %(default)s)",
+    )
+
+    mail_parser = subparsers.add_parser(
+        "import-mail", help="Import an mbox file or Maildir directory"
+    )
+    mail_parser.add_argument("path", type=Path)
+    mail_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="Messages written per transaction (default: %(default)s)",
+    )
+
+    telegram_parser = subparsers.add_parser(
+        "import-telegram", help="Import a Telegram Desktop export (result.json)"
+    )
+    telegram_parser.add_argument("path", type=Path)
+    telegram_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="Messages written per transaction (default: %(default)s)",
+    )
+
+    index_parser = subparsers.add_parser(
+        "index-metadata", help="Index metadata keys for fast filtering"
+    )
+    index_parser.add_argument(
+        "keys",
+        nargs="*",
+        default=list(DEFAULT_KEYS),
+        help="Metadata keys to index (default: %(default)s)",
+    )
+    index_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BACKFILL_BATCH,
+        help="Documents back-filled per transaction (default: %(default)s)",
+    )
+    index_parser.add_argument(
+        "--pause",
+        type=float,
+        default=0.0,
+        help="Seconds to pause between back-fill batches (default: %(default)s)",
+    )
+
+    subparsers.add_parser(
+        "backfill-status", help="Show pending embedding and summary backfill work"
+    )
+
+    compact_parser = subparsers.add_parser(
+        "compact", help="Remove orphaned rows, vacuum and optimize storage"
+    )
+    compact_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=CompactionConfig().batch_size,
+        help="Rows deleted per transaction (default: %(default)s)",
+    )
+    compact_parser.add_argument(
+        "--pause",
+        type=float,
+        default=CompactionConfig().pause,
+        help="Seconds to pause between batches (default: %(default)s)",
+    )
+    compact_parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Rebuild the file with a full VACUUM (repacks pages, locks meanwhile)",
+    )
+    compact_parser.add_argument(
+        "--dry-run", action="store_true", help="Only count orphaned rows"
+    )
+    compact_parser.add_argument(
+        "--every",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Keep running, compacting every SECONDS",
+    )
+
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
     """Sync entry point."""
-    asyncio.run(async_main())
+    args = get_parser().parse_args(argv)
+    try:
+        asyncio.run(async_main(args))
+    except KeyboardInterrupt:
+        logger.info("Interrupted")
@@ -0,0 +1,266 @@
+"""Indexed metadata filtering over DocumentTable.metadata_json.
+
+Filtering on metadata_json means parsing JSON for every document. Instead,
+keys are declared (declare_keys) and their values materialized into the
+document_metadata side table, with covering (key, value, document_id)
+indexes:
+
+- the write path adds rows for declared keys as documents are inserted
+  (metadata_rows, used by the importers' BatchWriter);
+- documents that existed before a key was declared are back-filled online
+  in small batches, each its own short transaction (backfill); the last
+  batch also catches documents written without rows while the back-fill
+  ran, before the key is marked complete;
+- compile_filters turns MetadataFilter predicates into indexed subqueries
+  for back-filled keys, falling back to json_extract for other keys so
+  results are correct while a back-fill is still running.
+"""
+
+import asyncio
+import logging
+import re
+import uuid
+from typing import Any, Collection, Iterable, Literal, Mapping, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import ColumnElement, and_, case, exists, func, insert, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col, select
+
+from raggamuffin.models import DocumentMetadataTable, DocumentTable, MetadataKeyTable
+
+logger = logging.getLogger(__name__)
+
+KEY_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+DEFAULT_KEYS = ("mime_type", "path", "chat_id", "from")
+DEFAULT_BACKFILL_BATCH = 1000
+
+# Sorts after any string starting with a given prefix
+PREFIX_END = "\U0010ffff"
+
+Op = Literal["eq", "ne", "lt", "le", "gt", "ge", "in", "prefix"]
+
+
+def _check_key(key: str) -> str:
+    if not KEY_RE.match(key):
+        raise ValueError(f"Invalid metadata key: {key!r}")
+    return key
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def metadata_rows(
+    document_id: uuid.UUID,
+    metadata: Optional[Mapping[str, Any]],
+    keys: Collection[str],
+) -> list[dict[str, Any]]:
+    """document_metadata rows for the declared keys present in metadata."""
+    if not metadata:
+        return []
+    rows = []
+    for key in keys:
+        value = metadata.get(key)
+        if isinstance(value, str):
+            rows.append({"document_id": document_id, "key": key, "value_text": value})
+        elif _is_number(value):
+            rows.append({"document_id": document_id, "key": key, "value_number": value})
+    return rows
+
+
+async def declared_keys(session: AsyncSession) -> set[str]:
+    """All declared keys, including those still being back-filled."""
+    result = await session.execute(select(MetadataKeyTable.key))
+    return set(result.scalars().all())
+
+
+async def indexed_keys(session: AsyncSession) -> set[str]:
+    """Declared keys whose back-fill is complete, safe for indexed lookups."""
+    result = await session.execute(
+        select(MetadataKeyTable.key).where(col(MetadataKeyTable.complete).is_(True))
+    )
+    return set(result.scalars().all())
+
+
+async def declare_keys(session: AsyncSession, keys: Iterable[str]) -> None:
+    """Declare keys as indexed; new keys start out pending back-fill."""
+    existing = await declared_keys(session)
+    for key in keys:
+        if _check_key(key) not in existing:
+            session.add(MetadataKeyTable(key=key))
+            existing.add(key)
+    await session.commit()
+
+
+# ============================================================================
+# Back-fill
+# ============================================================================
+
+
+async def backfill_batch(
+    session: AsyncSession, key: str, batch_size: int = DEFAULT_BACKFILL_BATCH
+) -> bool:
+    """Back-fill the next batch of documents for key; True once complete.
+
+    Documents are visited in id order; the cursor is stored with the batch,
+    so an interrupted back-fill resumes where it stopped.
+
+    Writers that started before the key was declared add documents without
+    rows for it, and their (random) ids may sort below the cursor. So the
+    last batch is an anti-join over all documents instead of a range: only
+    documents without a row for key are checked, and any missed are filled
+    in before the key is marked complete.
+    """
+    state = await session.get(MetadataKeyTable, _check_key(key))
+    if state is None:
+        raise KeyError(f"Metadata key not declared: {key}")
+    if state.complete:
+        return True
+
+    scope = []
+    if state.backfill_cursor is not None:
+        scope.append(col(DocumentTable.id) > uuid.UUID(state.backfill_cursor))
+
+    # Upper id of this batch; None when the rest fits in one batch
+    result = await session.execute(
+        select(DocumentTable.id)
+        .where(*scope)
+        .order_by(col(DocumentTable.id))
+        .offset(batch_size - 1)
+        .limit(1)
+    )
+    upper: Optional[uuid.UUID] = result.scalar()
+    if upper is not None:
+        scope.append(col(DocumentTable.id) <= upper)
+    else:
+        scope = [
+            ~exists().where(
+                col(DocumentMetadataTable.document_id) == DocumentTable.id,
+                col(DocumentMetadataTable.key) == key,
+            )
+        ]
+
+    path = f"$.{key}"
+    value = func.json_extract(DocumentTable.metadata_json, path)
+    kind = func.json_type(DocumentTable.metadata_json, path)
+    await session.execute(
+        insert(DocumentMetadataTable)
+        .prefix_with("OR IGNORE")
+        .from_select(
+            ["document_id", "key", "value_text", "value_number"],
+            select(
+                DocumentTable.id,
+                literal(key),
+                case((kind == "text", value)),
+                case((kind.in_(("integer", "real")), value)),
+            ).where(*scope, kind.in_(("text", "integer", "real"))),
+        )
+    )
+
+    if upper is None:
+        state.complete = True
+    else:
+        state.backfill_cursor = upper.hex
+    session.add(state)
+    await session.commit()
+    return state.complete
+
+
+async def backfill(
+    session: AsyncSession,
+    keys: Optional[Iterable[str]] = None,
+    batch_size: int = DEFAULT_BACKFILL_BATCH,
+    pause: float = 0.0,
+) -> None:
+    """Back-fill keys (default: all pending) until complete.
+
+    Each batch commits separately and `pause` seconds are left between
+    batches, so writers and readers are never blocked for long.
+    """
+    if keys is None:
+        result = await session.execute(
+            select(MetadataKeyTable.key).where(
+                col(MetadataKeyTable.complete).is_(False)
+            )
+        )
+        keys = result.scalars().all()
+
+    for key in keys:
+        batches = 1
+        while not await backfill_batch(session, key, batch_size):
+            batches += 1
+            if pause:
+                await asyncio.sleep(pause)
+        logger.info("Back-filled metadata key %s in %d batches", key, batches)
+
+
+# ============================================================================
+# Query compilation
+# ============================================================================
+
+
+class MetadataFilter(BaseModel):
+    """A predicate on a metadata key, e.g. MetadataFilter(key="path",
+    op="prefix", value="/home/me/notes/")."""
+
+    key: str
+    op: Op = "eq"
+    value: str | int | float | list[str | int | float]
+
+
+def _compare(column: Any, op: Op, value: Any) -> ColumnElement[bool]:
+    if op == "eq":
+        return column == value
+    if op == "ne":
+        return column != value
+    if op == "lt":
+        return column < value
+    if op == "le":
+        return column <= value
+    if op == "gt":
+        return column > value
+    if op == "ge":
+        return column >= value
+    if op == "in":
+        return column.in_(value)
+    if op == "prefix":
+        return and_(column >= value, column < value + PREFIX_END)
+    raise ValueError(f"Unknown operator: {op}")
+
+
+def compile_filter(
+    filter: MetadataFilter, indexed: Collection[str]
+) -> ColumnElement[bool]:
+    """Predicate on DocumentTable for one metadata filter."""
+    key = _check_key(filter.key)
+    if filter.op == "prefix" and not isinstance(filter.value, str):
+        raise ValueError("prefix filters need a string value")
+
+    sample = filter.value[0] if isinstance(filter.value, list) else filter.value
+    if key not in indexed:
+        # Not (yet) materialized: correct, but scans metadata_json
+        column = func.json_extract(DocumentTable.metadata_json, f"$.{key}")
+        return _compare(column, filter.op, filter.value)
+
+    value_column = (
+        DocumentMetadataTable.value_number
+        if _is_number(sample)
+        else DocumentMetadataTable.value_text
+    )
+    return col(DocumentTable.id).in_(
+        select(DocumentMetadataTable.document_id).where(
+            DocumentMetadataTable.key == key,
+            _compare(value_column, filter.op, filter.value),
+        )
+    )
+
+
+def compile_filters(
+    filters: Iterable[MetadataFilter], indexed: Collection[str]
+) -> list[ColumnElement[bool]]:
+    """Predicates for all filters, to be combined with AND in a query:
+
+    select(DocumentTable).where(*compile_filters(filters, indexed))
+    """
+    return [compile_filter(filter, indexed) for filter in filters]
@@ -7,11 +7,18 @@ Re-exports all models for convenient imports:
     from raggamuffin.models import DocumentTable, PersonTable, ...
 """
 
+# Backfill bookkeeping
+from raggamuffin.models.backfill import (
+    BackfillFailureTable,
+    BackfillStateTable,
+    QueryHitTable,
+)
+
 # Base mixins
 from raggamuffin.models.base import DatedMixin, EmbeddableMixin, EventMixin
 
 # Chunk
-from raggamuffin.models.chunk import ChunkTable
+from raggamuffin.models.chunk import ChunkLSHBandTable, ChunkTable
 
 # Document hierarchy
 from raggamuffin.models.document import (
@@ -30,6 +37,7 @@ from raggamuffin.models.document_set import (
 
 # Entity hierarchy
 from raggamuffin.models.entity import (
+    EntityIdentifierTable,
     EntitySourceLink,
     EntityTable,
     OrganizationHierarchyLink,
@@ -42,11 +50,19 @@ from raggamuffin.models.entity import (
 from raggamuffin.models.event import (
     MeetingParticipantLink,
     MeetingTable,
+    MessageRecipientLink,
     MessageTable,
 )
 
+# Metadata index
+from raggamuffin.models.metadata import DocumentMetadataTable, MetadataKeyTable
+
 # Reference types
-from raggamuffin.models.reference import SourceTable, SourceTypeTable
+from raggamuffin.models.reference import (
+    ImportStateTable,
+    SourceTable,
+    SourceTypeTable,
+)
 
 __all__ = [
     # Mixins
@@ -56,11 +72,13 @@ __all__ = [
     # Reference
     "SourceTypeTable",
     "SourceTable",
+    "ImportStateTable",
     # Entity
     "EntityTable",
     "PersonTable",
     "OrganizationTable",
     "EntitySourceLink",
+    "EntityIdentifierTable",
     "OrganizationPersonLink",
     "OrganizationHierarchyLink",
     # Document
@@ -68,14 +86,23 @@ __all__ = [
     "TextDocumentTable",
     "ImageTable",
     "DocumentCreatorLink",
+    # Metadata
+    "MetadataKeyTable",
+    "DocumentMetadataTable",
     # Chunk
     "ChunkTable",
+    "ChunkLSHBandTable",
     # Event
     "MessageTable",
     "MeetingTable",
     "MeetingParticipantLink",
+    "MessageRecipientLink",
     # DocumentSet
     "DocumentSetTable",
     "ConversationTable",
     "DocumentSetDocumentLink",
+    # Backfill
+    "BackfillStateTable",
+    "BackfillFailureTable",
+    "QueryHitTable",
 ]
@@ -0,0 +1,46 @@
+"""Backfill bookkeeping: scheduler checkpoints, failures and query hits.
+
+See backfill.py for the scheduler using these tables.
+"""
+
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlmodel import Field, SQLModel
+
+
+class BackfillStateTable(SQLModel, table=True):
+    """Progress of a backfill task, checkpointed with every batch."""
+
+    __tablename__ = "backfill_state"
+
+    task: str = Field(primary_key=True)  # e.g. "chunk.dense_embedding"
+    processed: int = Field(default=0)
+    failed: int = Field(default=0)
+    # Smoothed throughput in items per second, for ETAs across restarts
+    rate: Optional[float] = Field(default=None)
+    updated: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class BackfillFailureTable(SQLModel, table=True):
+    """An item a backfill task failed on; skipped after too many attempts."""
+
+    __tablename__ = "backfill_failure"
+
+    task: str = Field(primary_key=True)
+    item_id: uuid.UUID = Field(primary_key=True)
+    attempts: int = Field(default=1)
+    error: Optional[str] = Field(default=None)
+
+
+class QueryHitTable(SQLModel, table=True):
+    """When a document, chunk or entity was last returned by a query."""
+
+    __tablename__ = "query_hit"
+
+    item_id: uuid.UUID = Field(primary_key=True)
+    hits: int = Field(default=1)
+    last_hit: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc), index=True
+    )
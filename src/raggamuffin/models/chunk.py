@@ -3,7 +3,7 @@
 import uuid
 from typing import TYPE_CHECKING, Optional
 
-from sqlalchemy import LargeBinary
+from sqlalchemy import Index, LargeBinary, text
 from sqlmodel import Field, Relationship, SQLModel
 
 if TYPE_CHECKING:
@@ -14,9 +14,26 @@ class ChunkTable(SQLModel, table=True):
     """Chunk of a document for embedding/retrieval."""
 
     __tablename__ = "chunk"
+    __table_args__ = (
+        # Neighbour lookups: sequence ranges within a document (see context.py)
+        Index("ix_chunk_document_sequence", "document_id", "sequence"),
+        # Pending backfill work (see backfill.py); aliases reuse the
+        # embeddings of their canonical chunk and never need their own
+        Index(
+            "ix_chunk_needs_dense_embedding",
+            "id",
+            sqlite_where=text("dense_embedding IS NULL AND canonical_id IS NULL"),
+        ),
+        Index(
+            "ix_chunk_needs_sparse_embedding",
+            "id",
+            sqlite_where=text("sparse_embedding IS NULL AND canonical_id IS NULL"),
+        ),
+    )
 
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
-    document_id: uuid.UUID = Field(foreign_key="document.id", index=True)
+    # Indexed through ix_chunk_document_sequence, which leads with document_id
+    document_id: uuid.UUID = Field(foreign_key="document.id")
 
     # Chunk-specific fields
     sequence: int = Field(default=0, index=True)  # Order within document
@@ -28,5 +45,22 @@ class ChunkTable(SQLModel, table=True):
     sparse_embedding: Optional[bytes] = Field(default=None, sa_type=LargeBinary)
     dense_embedding: Optional[bytes] = Field(default=None, sa_type=LargeBinary)
 
+    # Near-duplicate detection (see dedup.py): MinHash signature as uint32
+    # bytes, and for aliases the canonical chunk whose embeddings they reuse
+    minhash: Optional[bytes] = Field(default=None, sa_type=LargeBinary)
+    canonical_id: Optional[uuid.UUID] = Field(
+        default=None, foreign_key="chunk.id", index=True
+    )
+
     # Relationship
     document: "DocumentTable" = Relationship(back_populates="chunks")
+
+
+class ChunkLSHBandTable(SQLModel, table=True):
+    """LSH band index over canonical chunk MinHash signatures."""
+
+    __tablename__ = "chunk_lsh_band"
+
+    band: int = Field(primary_key=True)
+    bucket: int = Field(primary_key=True)  # Hash of the band's signature rows
+    chunk_id: uuid.UUID = Field(foreign_key="chunk.id", primary_key=True, index=True)
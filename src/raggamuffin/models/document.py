@@ -7,7 +7,7 @@ for type-specific fields (text_document, image).
 import uuid
 from typing import TYPE_CHECKING, Optional
 
-from sqlalchemy import JSON, LargeBinary
+from sqlalchemy import JSON, Index, LargeBinary, text
 from sqlmodel import Field, Relationship, SQLModel
 
 from raggamuffin.models.base import DatedMixin, EmbeddableMixin
@@ -48,10 +48,26 @@ class DocumentTable(DatedMixin, EmbeddableMixin, SQLModel, table=True):
     """
 
     __tablename__ = "document"
+    __table_args__ = (
+        # Pending backfill work (see backfill.py), partial so they stay small
+        Index(
+            "ix_document_needs_dense_embedding",
+            "id",
+            sqlite_where=text("dense_embedding IS NULL"),
+        ),
+        Index(
+            "ix_document_needs_sparse_embedding",
+            "id",
+            sqlite_where=text("sparse_embedding IS NULL"),
+        ),
+        Index("ix_document_needs_summary", "id", sqlite_where=text("summary IS NULL")),
+    )
 
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     type: str = Field(index=True)  # Discriminator: "text_document", "image", etc.
     source_id: uuid.UUID = Field(foreign_key="source.id", index=True)
+    # Identifier within the source (Message-ID, file path, ...), for dedupe
+    external_id: Optional[str] = Field(default=None, index=True)
     metadata_json: Optional[str] = Field(default=None, sa_type=JSON)
 
     # Relationships
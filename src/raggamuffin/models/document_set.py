@@ -48,6 +48,8 @@ class DocumentSetTable(SQLModel, table=True):
 
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     type: str = Field(index=True, default="document_set")  # Discriminator
+    # Identifier of the set in its origin (e.g. a chat id), for re-imports
+    external_id: Optional[str] = Field(default=None, index=True)
 
     # Conversation-specific fields (null for base DocumentSet)
     start_date: Optional[datetime] = Field(default=None)
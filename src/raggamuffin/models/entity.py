@@ -7,13 +7,18 @@ with a `type` discriminator column.
 import uuid
 from typing import TYPE_CHECKING
 
+from sqlalchemy import Index, text
 from sqlmodel import Field, Relationship, SQLModel
 
 from raggamuffin.models.base import DatedMixin, EmbeddableMixin
 
 if TYPE_CHECKING:
     from raggamuffin.models.document import DocumentCreatorLink
-    from raggamuffin.models.event import MeetingParticipantLink, MessageTable
+    from raggamuffin.models.event import (
+        MeetingParticipantLink,
+        MessageRecipientLink,
+        MessageTable,
+    )
     from raggamuffin.models.reference import SourceTable
 
 
@@ -34,6 +39,18 @@ class EntitySourceLink(SQLModel, table=True):
     source: "SourceTable" = Relationship(back_populates="entity_links")
 
 
+class EntityIdentifierTable(SQLModel, table=True):
+    """External identifiers of an entity, e.g. ("email", "jane@example.com")."""
+
+    __tablename__ = "entity_identifier"
+
+    scheme: str = Field(primary_key=True)
+    value: str = Field(primary_key=True)
+    entity_id: uuid.UUID = Field(foreign_key="entity.id", index=True)
+
+    entity: "EntityTable" = Relationship(back_populates="identifiers")
+
+
 class OrganizationPersonLink(SQLModel, table=True):
     """Link table: Organization <-> Person (many-to-many)."""
 
@@ -88,6 +105,20 @@ class EntityTable(DatedMixin, EmbeddableMixin, SQLModel, table=True):
     """
 
     __tablename__ = "entity"
+    __table_args__ = (
+        # Pending backfill work (see backfill.py), partial so they stay small
+        Index(
+            "ix_entity_needs_dense_embedding",
+            "id",
+            sqlite_where=text("dense_embedding IS NULL"),
+        ),
+        Index(
+            "ix_entity_needs_sparse_embedding",
+            "id",
+            sqlite_where=text("sparse_embedding IS NULL"),
+        ),
+        Index("ix_entity_needs_summary", "id", sqlite_where=text("summary IS NULL")),
+    )
 
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     type: str = Field(index=True, default="entity")  # Discriminator
@@ -95,6 +126,7 @@ class EntityTable(DatedMixin, EmbeddableMixin, SQLModel, table=True):
 
     # Relationships
     source_links: list[EntitySourceLink] = Relationship(back_populates="entity")
+    identifiers: list[EntityIdentifierTable] = Relationship(back_populates="entity")
 
     # Organization-specific relationships (empty for Person)
     organization_persons: list[OrganizationPersonLink] = Relationship(
@@ -133,6 +165,9 @@ class EntityTable(DatedMixin, EmbeddableMixin, SQLModel, table=True):
     meeting_participations: list["MeetingParticipantLink"] = Relationship(
         back_populates="participant"
     )
+    received_message_links: list["MessageRecipientLink"] = Relationship(
+        back_populates="recipient"
+    )
 
 
 # Type aliases for clarity - Person and Organization are EntityTable with type discriminator
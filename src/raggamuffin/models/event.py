@@ -33,6 +33,26 @@ class MeetingParticipantLink(SQLModel, table=True):
     participant: "EntityTable" = Relationship(back_populates="meeting_participations")
 
 
+class MessageRecipientLink(SQLModel, table=True):
+    """Link table: Message <-> Entity (all recipients, many-to-many).
+
+    MessageTable.recipient_id holds the primary recipient; this table holds
+    every addressee, e.g. all To and Cc addresses of an email.
+    """
+
+    __tablename__ = "message_recipient_link"
+
+    message_id: uuid.UUID = Field(foreign_key="message.id", primary_key=True)
+    recipient_id: uuid.UUID = Field(
+        foreign_key="entity.id", primary_key=True, index=True
+    )
+    # How the recipient was addressed, e.g. "to" or "cc"
+    role: str = Field(default="to")
+
+    message: "MessageTable" = Relationship(back_populates="recipient_links")
+    recipient: "EntityTable" = Relationship(back_populates="received_message_links")
+
+
 # ============================================================================
 # Event Tables (Joined from TextDocument)
 # ============================================================================
@@ -61,6 +81,7 @@ class MessageTable(EventMixin, SQLModel, table=True):
         back_populates="received_messages",
         sa_relationship_kwargs={"foreign_keys": "[MessageTable.recipient_id]"},
     )
+    recipient_links: list[MessageRecipientLink] = Relationship(back_populates="message")
 
 
 class MeetingTable(EventMixin, SQLModel, table=True):
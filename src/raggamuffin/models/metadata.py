@@ -0,0 +1,39 @@
+"""Indexed document metadata: declared keys and their materialized values.
+
+DocumentTable.metadata_json is free-form JSON, so filtering on it scans and
+parses every row. Declared keys are materialized into the narrow
+document_metadata table, indexed by (key, value), see metadata.py.
+"""
+
+import uuid
+from typing import Optional
+
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+
+class MetadataKeyTable(SQLModel, table=True):
+    """A declared, indexed metadata key and its back-fill progress."""
+
+    __tablename__ = "metadata_key"
+
+    key: str = Field(primary_key=True)
+    # Last document id back-filled; None before the first batch
+    backfill_cursor: Optional[str] = Field(default=None)
+    complete: bool = Field(default=False)
+
+
+class DocumentMetadataTable(SQLModel, table=True):
+    """Materialized value of a declared metadata key for a document."""
+
+    __tablename__ = "document_metadata"
+    __table_args__ = (
+        # Covering indexes: filters resolve to document ids from the index alone
+        Index("ix_document_metadata_text", "key", "value_text", "document_id"),
+        Index("ix_document_metadata_number", "key", "value_number", "document_id"),
+    )
+
+    document_id: uuid.UUID = Field(foreign_key="document.id", primary_key=True)
+    key: str = Field(primary_key=True)
+    value_text: Optional[str] = Field(default=None)
+    value_number: Optional[float] = Field(default=None)
@@ -1,7 +1,8 @@
-"""Reference types: SourceType and Source tables."""
+"""Reference types: SourceType, Source and ImportState tables."""
 
 import uuid
-from typing import TYPE_CHECKING
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Optional
 
 from sqlmodel import Field, Relationship, SQLModel
 
@@ -29,8 +30,26 @@ class SourceTable(SQLModel, table=True):
 
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     source_type_id: uuid.UUID = Field(foreign_key="source_type.id", index=True)
+    # Locator of the source, e.g. "mbox:///home/me/mail/inbox"
+    uri: Optional[str] = Field(default=None, index=True, unique=True)
+    # Index generation, bumped by the write path on every ingest (see cache.py)
+    generation: int = Field(default=0)
 
     # Relationships
     source_type: SourceTypeTable = Relationship(back_populates="sources")
     entity_links: list["EntitySourceLink"] = Relationship(back_populates="source")
     documents: list["DocumentTable"] = Relationship(back_populates="source")
+    import_states: list["ImportStateTable"] = Relationship(back_populates="source")
+
+
+class ImportStateTable(SQLModel, table=True):
+    """Resume state of an importer for a source (offsets, watermarks)."""
+
+    __tablename__ = "import_state"
+
+    source_id: uuid.UUID = Field(foreign_key="source.id", primary_key=True)
+    key: str = Field(primary_key=True)
+    value: str
+    updated: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    source: SourceTable = Relationship(back_populates="import_states")
@@ -0,0 +1,357 @@
+"""Single-writer actor and read-only connection pool for one SQLite file.
+
+SQLite allows a single writer at a time. When ingestion tasks and searches
+share one engine (get_engine), every writer transaction competes for the
+database lock, readers in rollback-journal mode are blocked by writers, and
+callers end up with "database is locked" errors. Store splits the two:
+
+- WriteActor owns the only write connection, on a thread of its own.
+  Callers submit write operations to its queue; the actor groups whatever
+  is queued into one transaction (group commit) and resolves each caller's
+  future once the transaction has committed.
+- Reads go through a separate pool of read-only connections. The database
+  runs in WAL mode, so readers see the last committed state and are never
+  blocked by the writer.
+
+The importers write through a Store (see importers/base.py). A load test
+comparing it with a shared engine lives in tests/test_store.py.
+
+Usage:
+    async with Store(Path("database.db")) as store:
+        await store.write(lambda session: add_documents(session, batch))
+        async with store.read() as session:
+            result = await session.execute(select(DocumentTable))
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+from pydantic import BaseModel, Field
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.sql import Executable
+
+from raggamuffin.database import create_all
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# A write operation: runs against the actor's session, must not commit
+WriteOp = Callable[[AsyncSession], Awaitable[T]]
+
+
+class StoreConfig(BaseModel):
+    """Configuration for the write actor and read pool."""
+
+    # Read-only connections kept open for queries
+    read_connections: int = Field(default=4, ge=1)
+    # Write operations grouped into one transaction at most
+    max_batch: int = Field(default=64, ge=1)
+    # Seconds the actor waits for more operations before committing a group
+    max_delay: float = Field(default=0.005, ge=0)
+    # Pending write operations before submit() applies backpressure
+    queue_size: int = Field(default=1024, ge=1)
+    # Milliseconds a connection waits on a lock held by another process
+    busy_timeout: int = Field(default=5000, ge=0)
+
+
+class WriteStats(BaseModel):
+    """Counters for the write actor."""
+
+    operations: int = 0
+    transactions: int = 0
+    failed: int = 0
+
+    @property
+    def group_size(self) -> float:
+        """Average number of operations committed per transaction."""
+        return self.operations / self.transactions if self.transactions else 0.0
+
+
+def _set_pragmas(engine: AsyncEngine, pragmas: dict[str, Any]) -> None:
+    """Apply pragmas to every new DBAPI connection of engine."""
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def connect(dbapi_connection: Any, connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def get_write_engine(path: Path, busy_timeout: int = 5000) -> AsyncEngine:
+    """Engine with a single connection, switching the database to WAL."""
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{path}", pool_size=1, max_overflow=0
+    )
+    _set_pragmas(
+        engine,
+        {"journal_mode": "WAL", "synchronous": "NORMAL", "busy_timeout": busy_timeout},
+    )
+    return engine
+
+
+def get_read_engine(
+    path: Path, pool_size: int = 4, busy_timeout: int = 5000
+) -> AsyncEngine:
+    """Engine with a pool of read-only connections to an existing database."""
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///file:{path.resolve()}?mode=ro&uri=true",
+        pool_size=pool_size,
+        max_overflow=0,
+    )
+    _set_pragmas(engine, {"query_only": "ON", "busy_timeout": busy_timeout})
+    return engine
+
+
+# ============================================================================
+# Write actor
+# ============================================================================
+
+
+class WriteActor:
+    """Serialize all writes through one connection, committing in groups.
+
+    The actor runs its own event loop in a dedicated thread, so the CPU
+    spent preparing and committing writes does not stall readers on the
+    caller's loop. Operations are coroutines run on the actor's loop and
+    should only act through the session they are given.
+
+    Operations in a group share a transaction. If any of them fails, the
+    group is rolled back and its operations are retried one transaction
+    each, so a failing operation only fails its own caller (and operations
+    may run more than once).
+    """
+
+    engine: AsyncEngine
+    config: StoreConfig
+
+    def __init__(self, engine: AsyncEngine, config: Optional[StoreConfig] = None):
+        self.engine = engine
+        self.config = config or StoreConfig()
+        self.stats = WriteStats()
+        self._queue: asyncio.Queue[
+            Optional[tuple[WriteOp[Any], asyncio.Future[Any]]]
+        ] = asyncio.Queue(self.config.queue_size)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def pending(self) -> int:
+        """Operations waiting in the queue."""
+        return self._queue.qsize()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        ready = threading.Event()
+
+        def main() -> None:
+            loop = asyncio.new_event_loop()
+            self._loop = loop
+            ready.set()
+            try:
+                loop.run_until_complete(self._run())
+            finally:
+                loop.close()
+
+        self._thread = threading.Thread(target=main, name="write-actor", daemon=True)
+        self._thread.start()
+        await asyncio.to_thread(ready.wait)
+
+    async def stop(self) -> None:
+        """Commit all queued operations, then close the write connection."""
+        if not self.running:
+            return
+        assert self._loop is not None and self._thread is not None
+        await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(self._queue.put(None), self._loop)
+        )
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+
+    async def _enqueue(self, op: WriteOp[T]) -> T:
+        future: asyncio.Future[T] = asyncio.get_running_loop().create_future()
+        await self._queue.put((op, future))
+        return await future
+
+    async def submit(self, op: WriteOp[T]) -> T:
+        """Queue a write operation; returns its result once committed."""
+        if not self.running:
+            raise RuntimeError("Write actor is not running")
+        assert self._loop is not None
+        return await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(self._enqueue(op), self._loop)
+        )
+
+    async def execute(
+        self, statement: Executable, params: Optional[dict[str, Any]] = None
+    ) -> None:
+        """Queue a single statement."""
+
+        async def op(session: AsyncSession) -> None:
+            await session.execute(statement, params)
+
+        await self.submit(op)
+
+    async def _collect(
+        self, first: tuple[WriteOp[Any], asyncio.Future[Any]]
+    ) -> tuple[list[tuple[WriteOp[Any], asyncio.Future[Any]]], bool]:
+        """Group first with what arrives within max_delay; True on shutdown."""
+        group = [first]
+        deadline = time.monotonic() + self.config.max_delay
+        while len(group) < self.config.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if item is None:
+                return group, True
+            group.append(item)
+        return group, False
+
+    async def _commit(
+        self,
+        session: AsyncSession,
+        group: list[tuple[WriteOp[Any], asyncio.Future[Any]]],
+    ) -> None:
+        # Callers that gave up before their turn are not run at all
+        group = [(op, future) for op, future in group if not future.done()]
+        if not group:
+            return
+
+        try:
+            results = [await op(session) for op, _ in group]
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            if len(group) > 1:
+                logger.debug("Group of %d failed, retrying one by one", len(group))
+                for item in group:
+                    if not item[1].done():
+                        await self._commit(session, [item])
+                return
+            self.stats.failed += 1
+            # The caller may have been cancelled while its operation ran
+            future = group[0][1]
+            if not future.done():
+                future.set_exception(e)
+            return
+
+        self.stats.operations += len(group)
+        self.stats.transactions += 1
+        for (_, future), result in zip(group, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _run(self) -> None:
+        try:
+            async with async_sessionmaker(
+                self.engine, expire_on_commit=False
+            )() as session:
+                stopping = False
+                while not stopping:
+                    first = await self._queue.get()
+                    if first is None:
+                        break
+                    group, stopping = await self._collect(first)
+                    await self._commit(session, group)
+
+                # Operations queued behind the stop marker
+                while not self._queue.empty():
+                    item = self._queue.get_nowait()
+                    if item is not None:
+                        await self._commit(session, [item])
+        finally:
+            # Never leave a caller waiting on a dead actor
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is not None and not item[1].done():
+                    item[1].set_exception(RuntimeError("Write actor stopped"))
+            await self.engine.dispose()
+
+        logger.info(
+            "Write actor stopped: %d operations in %d transactions",
+            self.stats.operations,
+            self.stats.transactions,
+        )
+
+
+# ============================================================================
+# Store
+# ============================================================================
+
+
+class Store:
+    """A SQLite database with one write actor and a read-only pool."""
+
+    path: Path
+    config: StoreConfig
+
+    def __init__(self, path: Path, config: Optional[StoreConfig] = None):
+        self.path = path
+        self.config = config or StoreConfig()
+        self.write_engine = get_write_engine(path, self.config.busy_timeout)
+        self.writer = WriteActor(self.write_engine, self.config)
+        self.read_engine: Optional[AsyncEngine] = None
+        self._read_sessions: Optional[async_sessionmaker[AsyncSession]] = None
+
+    async def open(self) -> None:
+        """Create the schema, switch to WAL and start the write actor."""
+        # The write engine creates the file; read-only connections cannot.
+        # Its connections are bound to this loop, so drop them before the
+        # actor's loop takes over the engine.
+        await create_all(self.write_engine)
+        await self.write_engine.dispose()
+        self.read_engine = get_read_engine(
+            self.path, self.config.read_connections, self.config.busy_timeout
+        )
+        self._read_sessions = async_sessionmaker(
+            self.read_engine, expire_on_commit=False
+        )
+        await self.writer.start()
+
+    async def close(self) -> None:
+        await self.writer.stop()
+        if self.read_engine is not None:
+            await self.read_engine.dispose()
+
+    async def __aenter__(self) -> "Store":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[AsyncSession]:
+        """Session on a pooled read-only connection."""
+        if self._read_sessions is None:
+            raise RuntimeError("Store is not open")
+        async with self._read_sessions() as session:
+            yield session
+
+    async def write(self, op: WriteOp[T]) -> T:
+        """Run a write operation through the write actor."""
+        return await self.writer.submit(op)
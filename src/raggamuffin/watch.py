@@ -0,0 +1,419 @@
+"""Continuous watch mode with debounced incremental ingestion.
+
+Instead of re-crawling everything on a schedule, `raggamuffin watch` keeps
+running and feeds only changed files into ingestion:
+
+1. A watcher reports raw change events: inotify on Linux, or a polling
+   fallback that compares mtime/size snapshots on other platforms.
+2. A ChangeDebouncer coalesces bursts: a path becomes due once it has been
+   quiet for the debounce window. Repeated events on a path collapse into
+   one pending entry.
+3. Due paths are ingested at a bounded rate; the CLI also lowers the
+   process priority (see main.watch_main).
+
+handler_ingest() writes each changed file through the Store as the text
+document of a "files" source, replacing its previous version.
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from pydantic import BaseModel, Field
+from sqlalchemy import delete, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col, select
+
+from raggamuffin.cache import bump_generation, index_generation
+from raggamuffin.handlers import DocumentHandler
+from raggamuffin.importers.base import get_or_create_source
+from raggamuffin.models import DocumentTable, SourceTable, TextDocumentTable
+from raggamuffin.store import Store
+
+logger = logging.getLogger(__name__)
+
+IngestFn = Callable[[Path], Awaitable[None]]
+
+SOURCE_TYPE = "files"
+
+
+class WatchConfig(BaseModel):
+    """Configuration for watch mode."""
+
+    # Quiet period (seconds) after the last event before a path is ingested
+    debounce: float = Field(default=2.0, ge=0)
+    # Upper bound on how long a continuously changing path is held back
+    max_delay: float = Field(default=30.0, ge=0)
+    # Ingestion rate limit
+    max_files_per_second: float = Field(default=10.0, gt=0)
+    # Scan interval (seconds) for the polling fallback
+    poll_interval: float = Field(default=10.0, gt=0)
+    # Use polling even when inotify is available
+    force_polling: bool = False
+
+
+# ============================================================================
+# Debouncing
+# ============================================================================
+
+
+class ChangeDebouncer:
+    """Coalesce change events per path until the path has been quiet."""
+
+    def __init__(self, window: float, max_delay: float):
+        self.window = window
+        self.max_delay = max_delay
+        # path -> (first seen, last seen)
+        self._pending: dict[Path, tuple[float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, path: Path, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        first, _ = self._pending.get(path, (now, now))
+        self._pending[path] = (first, now)
+
+    def _deadline(self, first: float, last: float) -> float:
+        return min(last + self.window, first + self.max_delay)
+
+    def next_deadline(self) -> Optional[float]:
+        if not self._pending:
+            return None
+        return min(self._deadline(*seen) for seen in self._pending.values())
+
+    def pop_due(self, now: Optional[float] = None) -> list[Path]:
+        """Remove and return all paths whose deadline has passed."""
+        now = time.monotonic() if now is None else now
+        due = [
+            path for path, seen in self._pending.items() if self._deadline(*seen) <= now
+        ]
+        for path in due:
+            del self._pending[path]
+        return due
+
+
+# ============================================================================
+# Watchers
+# ============================================================================
+
+
+class PollingWatcher:
+    """Portable watcher comparing (mtime, size) snapshots of matching files."""
+
+    def __init__(self, handler: DocumentHandler, interval: float):
+        self.handler = handler
+        self.interval = interval
+
+    def _scan(self) -> dict[Path, tuple[int, int]]:
+        snapshot: dict[Path, tuple[int, int]] = {}
+        for file_path in self.handler.path.glob(self.handler.glob):
+            try:
+                stat = file_path.stat()
+            except OSError:
+                continue
+            snapshot[file_path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    async def events(self) -> AsyncIterator[Path]:
+        previous = await asyncio.to_thread(self._scan)
+        while True:
+            await asyncio.sleep(self.interval)
+            current = await asyncio.to_thread(self._scan)
+            for path in current.keys() | previous.keys():
+                if current.get(path) != previous.get(path):
+                    yield path
+            previous = current
+
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def _load_libc() -> Optional[ctypes.CDLL]:
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    except OSError:
+        return None
+    return libc if hasattr(libc, "inotify_init1") else None
+
+
+class InotifyWatcher:
+    """Linux watcher using inotify through libc, watching directories recursively.
+
+    Modifications are reported on IN_CLOSE_WRITE, so a file being written is
+    reported once when the writer is done rather than on every write().
+    """
+
+    def __init__(self, handler: DocumentHandler, libc: ctypes.CDLL):
+        self.handler = handler
+        self._libc = libc
+        self._fd = -1
+        self._dirs: dict[int, Path] = {}
+
+    def _add_watch(self, directory: Path) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), str(directory))
+        self._dirs[wd] = directory
+
+    def _add_tree(self, root: Path) -> None:
+        self._add_watch(root)
+        for dirpath, dirnames, _ in os.walk(root):
+            for dirname in dirnames:
+                try:
+                    self._add_watch(Path(dirpath, dirname))
+                except PermissionError:
+                    logger.debug("Cannot watch %s", Path(dirpath, dirname))
+
+    def open(self) -> None:
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        try:
+            self._add_tree(self.handler.path)
+        except OSError:
+            self.close()
+            raise
+        logger.info("Watching %d directories with inotify", len(self._dirs))
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+        self._dirs.clear()
+
+    def _parse(self, data: bytes) -> list[Path]:
+        paths: list[Path] = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # Kernel queue overflowed and events were lost: rescan.
+                logger.warning(
+                    "inotify queue overflow, rescanning %s", self.handler.path
+                )
+                paths.extend(self.handler.path.glob(self.handler.glob))
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = directory / os.fsdecode(name)
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # New subtree: watch it and report files already inside.
+                    try:
+                        self._add_tree(path)
+                    except OSError as e:
+                        logger.warning("Cannot watch %s: %s", path, e)
+                    paths.extend(p for p in path.rglob("*") if p.is_file())
+                continue
+            paths.append(path)
+
+        return paths
+
+    async def events(self) -> AsyncIterator[Path]:
+        if self._fd < 0:
+            self.open()
+
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        loop.add_reader(self._fd, readable.set)
+        try:
+            while True:
+                await readable.wait()
+                readable.clear()
+                try:
+                    data = os.read(self._fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                for path in self._parse(data):
+                    yield path
+        finally:
+            loop.remove_reader(self._fd)
+            self.close()
+
+
+def get_watcher(
+    handler: DocumentHandler, config: WatchConfig
+) -> InotifyWatcher | PollingWatcher:
+    """Return an inotify watcher where available, else a polling watcher."""
+    libc = None if config.force_polling else _load_libc()
+    if libc is not None:
+        watcher = InotifyWatcher(handler, libc)
+        try:
+            watcher.open()
+            return watcher
+        except OSError as e:
+            # E.g. ENOSPC when fs.inotify.max_user_watches is exhausted
+            logger.warning("inotify unavailable (%s), falling back to polling", e)
+
+    logger.info("Polling %s every %.1fs", handler.path, config.poll_interval)
+    return PollingWatcher(handler, config.poll_interval)
+
+
+# ============================================================================
+# Watch loop
+# ============================================================================
+
+
+async def watch(
+    handler: DocumentHandler,
+    ingest: IngestFn,
+    config: Optional[WatchConfig] = None,
+) -> None:
+    """Watch handler.path and ingest changed files until cancelled.
+
+    `ingest` is called with each changed path matching the handler's glob,
+    including paths that were deleted; it should check for existence.
+    """
+    config = config or WatchConfig()
+    debouncer = ChangeDebouncer(config.debounce, config.max_delay)
+    changed = asyncio.Event()
+    watcher = get_watcher(handler, config)
+
+    async def collect() -> None:
+        async for path in watcher.events():
+            if handler.matches(path):
+                debouncer.add(path)
+                changed.set()
+
+    collector = asyncio.create_task(collect())
+    collector.add_done_callback(lambda _: changed.set())
+    interval = 1 / config.max_files_per_second
+    try:
+        while True:
+            deadline = debouncer.next_deadline()
+            timeout = None if deadline is None else deadline - time.monotonic()
+            if timeout is None or timeout > 0:
+                changed.clear()
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout)
+                except TimeoutError:
+                    pass
+                if collector.done():
+                    collector.result()  # Propagate watcher errors
+
+            for path in debouncer.pop_due():
+                started = time.monotonic()
+                try:
+                    await ingest(path)
+                except Exception:
+                    logger.exception("Failed to ingest %s", path)
+                await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+    finally:
+        collector.cancel()
+
+
+async def write_file(
+    session: AsyncSession, source_id: uuid.UUID, external_id: str, text: Optional[str]
+) -> Optional[int]:
+    """Write operation replacing the document of a file (None: remove it).
+
+    Returns the new index generation, or None if the stored text is already
+    current. Rows hanging off a replaced document (chunks, metadata, ...)
+    are left to compaction.
+    """
+    match = (
+        col(DocumentTable.source_id) == source_id,
+        col(DocumentTable.external_id) == external_id,
+    )
+    result = await session.execute(
+        select(TextDocumentTable.text).join(DocumentTable).where(*match)
+    )
+    if list(result.scalars()) == ([] if text is None else [text]):
+        return None
+
+    await session.execute(delete(DocumentTable).where(*match))
+    if text is not None:
+        document_id = uuid.uuid4()
+        now = datetime.now(timezone.utc)
+        await session.execute(
+            insert(DocumentTable),
+            [
+                {
+                    "id": document_id,
+                    "type": "text_document",
+                    "source_id": source_id,
+                    "external_id": external_id,
+                    "created": now,
+                    "modified": now,
+                }
+            ],
+        )
+        await session.execute(
+            insert(TextDocumentTable), [{"id": document_id, "text": text}]
+        )
+    return await bump_generation(session, source_id)
+
+
+def handler_ingest(handler: DocumentHandler, store: Store) -> IngestFn:
+    """Ingest function writing changed files through a Store.
+
+    Files become text documents of a source for handler.path, identified by
+    their path relative to it; a removed file deletes its document.
+    """
+    source: Optional[SourceTable] = None
+
+    async def get_source() -> SourceTable:
+        nonlocal source
+        if source is None:
+            uri = handler.path.resolve().as_uri()
+            source = await get_or_create_source(store, SOURCE_TYPE, uri)
+        return source
+
+    async def ingest(path: Path) -> None:
+        source_id = (await get_source()).id
+        text = None
+        if path.is_file():
+            text = await asyncio.to_thread(handler.read_text, path)
+            if text is None:
+                return
+        external_id = path.relative_to(handler.path).as_posix()
+
+        def write(session: AsyncSession) -> Awaitable[Optional[int]]:
+            return write_file(session, source_id, external_id, text)
+
+        generation = await store.write(write)
+        if generation is not None:
+            index_generation.bump(source_id, generation)
+            logger.info("%s: %s", "Ingested" if text is not None else "Removed", path)
+
+    return ingest
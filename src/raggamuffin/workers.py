@@ -0,0 +1,309 @@
+"""Multi-process worker pool for CPU-bound ingestion stages.
+
+Chunking and local embedding are CPU-bound, so running them on the asyncio
+event loop pins ingestion to a single core. The WorkerPool spreads them over
+a ProcessPoolExecutor instead.
+
+Embeddings are not pickled back to the parent: the pool allocates one
+`multiprocessing.shared_memory` block per call and every worker writes its
+batch of vectors straight into its rows of that block.
+
+Usage:
+    with WorkerPool(WorkerPoolConfig(workers=16)) as pool:
+        chunks = pool.chunk(texts)
+        vectors = pool.embed(texts, embed_fn, dim=384)
+
+`embed_fn` must be picklable (a module-level function) and return an array
+of shape (len(texts), dim).
+"""
+
+import asyncio
+import logging
+import os
+import sys
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+from typing import Any, Callable, Optional, Sequence
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from raggamuffin.chunking import (
+    DEFAULT_CHUNK_OVERLAP,
+    DEFAULT_CHUNK_SIZE,
+    TextChunk,
+    chunk_text,
+)
+
+logger = logging.getLogger(__name__)
+
+EmbedFn = Callable[[list[str]], np.ndarray]
+
+
+class WorkerPoolConfig(BaseModel):
+    """Configuration for the ingestion worker pool."""
+
+    # Number of worker processes; defaults to one per core
+    workers: int = Field(default_factory=lambda: os.cpu_count() or 1, ge=1)
+    # Number of texts handed to a worker per task
+    batch_size: int = Field(default=64, ge=1)
+    # How often a batch is resubmitted after its worker crashed
+    max_retries: int = Field(default=2, ge=0)
+    # Recycle workers after this many tasks (None: never), bounds leaks
+    max_tasks_per_child: Optional[int] = Field(default=None, ge=1)
+    # "spawn" is safe with threads and native libraries; "fork" starts faster
+    start_method: str = "spawn"
+
+
+class WorkerCrashError(RuntimeError):
+    """Raised when a batch keeps crashing its worker beyond max_retries."""
+
+
+# ============================================================================
+# Worker-side functions (executed in child processes)
+# ============================================================================
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # The parent owns the block; keep children from unlinking it on exit.
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+def _embed_batch(
+    embed: EmbedFn,
+    shm_name: str,
+    shape: tuple[int, int],
+    dtype: str,
+    start: int,
+    texts: list[str],
+) -> int:
+    """Embed texts and write the vectors to rows [start, start + len(texts))."""
+    vectors = np.asarray(embed(texts), dtype=dtype)
+    if vectors.shape != (len(texts), shape[1]):
+        raise ValueError(
+            f"embed returned shape {vectors.shape}, expected {(len(texts), shape[1])}"
+        )
+
+    shm = _attach(shm_name)
+    try:
+        out: np.ndarray = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        out[start : start + len(texts)] = vectors
+        del out  # Release the buffer export before closing
+    finally:
+        shm.close()
+
+    return start
+
+
+def _chunk_batch(texts: list[str], size: int, overlap: int) -> list[list[TextChunk]]:
+    return [chunk_text(text, size, overlap) for text in texts]
+
+
+# ============================================================================
+# Pool
+# ============================================================================
+
+
+class WorkerPool:
+    """Process pool for chunking and embedding with crash recovery.
+
+    Work is split into batches of `batch_size` items. If a worker dies (for
+    example killed by the OOM killer or a segfault in a native model), the
+    executor is recreated and the unfinished batches are resubmitted. A
+    batch that keeps crashing its worker fails the call after `max_retries`
+    retries; the pool stays usable afterwards.
+    """
+
+    config: WorkerPoolConfig
+
+    def __init__(self, config: Optional[WorkerPoolConfig] = None):
+        self.config = config or WorkerPoolConfig()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> "WorkerPool":
+        self._ensure_executor()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.shutdown()
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.config.workers,
+                mp_context=get_context(self.config.start_method),
+                max_tasks_per_child=self.config.max_tasks_per_child,
+            )
+        return self._executor
+
+    def _drop_executor(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _restart_executor(self) -> ProcessPoolExecutor:
+        logger.warning("Worker process died, restarting pool")
+        self._drop_executor()
+        return self._ensure_executor()
+
+    def _submit(self, fn: Callable[..., Any], args: tuple[Any, ...]) -> Future[Any]:
+        try:
+            return self._ensure_executor().submit(fn, *args)
+        except BrokenProcessPool:
+            # Broken by a crash that no result has reported yet
+            return self._restart_executor().submit(fn, *args)
+
+    def shutdown(self) -> None:
+        """Stop all worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _batches(self, count: int) -> list[tuple[int, int]]:
+        size = self.config.batch_size
+        return [(start, min(start + size, count)) for start in range(0, count, size)]
+
+    def _run(
+        self,
+        fn: Callable[..., Any],
+        batches: list[tuple[int, int]],
+        args_for: Callable[[int, int], tuple[Any, ...]],
+    ) -> dict[int, Any]:
+        """Run fn over all batches, resubmitting batches lost to a crash.
+
+        At most `workers` batches are in flight. A crash breaks the whole
+        pool and fails every batch in flight, not only the one that killed
+        its worker. When a single batch was lost it is to blame, and the
+        crash counts against its retries; when several were lost, they are
+        rerun one at a time, so a repeated crash is attributed to one batch.
+
+        Returns results keyed by batch start index.
+        """
+        results: dict[int, Any] = {}
+        attempts: dict[int, int] = {start: 0 for start, _ in batches}
+        pending = deque(batches)
+        # Lost in a crash together with other batches, rerun in isolation
+        suspects: deque[tuple[int, int]] = deque()
+        futures: dict[Future[Any], tuple[int, int]] = {}
+
+        while pending or suspects or futures:
+            if suspects:
+                if not futures:
+                    batch = suspects.popleft()
+                    futures[self._submit(fn, args_for(*batch))] = batch
+            else:
+                while pending and len(futures) < self.config.workers:
+                    batch = pending.popleft()
+                    futures[self._submit(fn, args_for(*batch))] = batch
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            lost: list[tuple[int, int]] = []
+            for future in done:
+                batch = futures.pop(future)
+                try:
+                    results[batch[0]] = future.result()
+                except BrokenProcessPool:
+                    lost.append(batch)
+            if not lost:
+                continue
+
+            # Batches still in flight died with the pool
+            lost.extend(futures.values())
+            futures.clear()
+            if len(lost) > 1:
+                suspects.extend(sorted(lost))
+                self._restart_executor()
+                continue
+
+            start, end = lost[0]
+            attempts[start] += 1
+            if attempts[start] > self.config.max_retries:
+                # The next call starts a fresh pool
+                self.shutdown()
+                raise WorkerCrashError(
+                    f"Batch [{start}, {end}) crashed its worker {attempts[start]} times"
+                )
+            pending.appendleft((start, end))
+            self._restart_executor()
+
+        return results
+
+    def chunk(
+        self,
+        texts: Sequence[str],
+        size: int = DEFAULT_CHUNK_SIZE,
+        overlap: int = DEFAULT_CHUNK_OVERLAP,
+    ) -> list[list[TextChunk]]:
+        """Chunk every text in parallel, preserving input order."""
+        batches = self._batches(len(texts))
+        results = self._run(
+            _chunk_batch,
+            batches,
+            lambda start, end: (list(texts[start:end]), size, overlap),
+        )
+        return [chunks for start, _ in batches for chunks in results[start]]
+
+    def embed(
+        self,
+        texts: Sequence[str],
+        embed: EmbedFn,
+        dim: int,
+        dtype: str = "float32",
+    ) -> np.ndarray:
+        """Embed every text in parallel into a (len(texts), dim) array."""
+        shape = (len(texts), dim)
+        if not texts:
+            return np.empty(shape, dtype=dtype)
+
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        try:
+            try:
+                self._run(
+                    _embed_batch,
+                    self._batches(len(texts)),
+                    lambda start, end: (
+                        embed,
+                        shm.name,
+                        shape,
+                        dtype,
+                        start,
+                        list(texts[start:end]),
+                    ),
+                )
+            except BaseException:
+                # Batches still in flight write into the block; wait for
+                # the workers to stop before it is unlinked
+                self.shutdown()
+                raise
+            view: np.ndarray = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            vectors = view.copy()
+            del view
+        finally:
+            shm.close()
+            shm.unlink()
+
+        return vectors
+
+    async def achunk(
+        self,
+        texts: Sequence[str],
+        size: int = DEFAULT_CHUNK_SIZE,
+        overlap: int = DEFAULT_CHUNK_OVERLAP,
+    ) -> list[list[TextChunk]]:
+        """Async wrapper for chunk() that keeps the event loop responsive."""
+        return await asyncio.to_thread(self.chunk, texts, size, overlap)
+
+    async def aembed(
+        self,
+        texts: Sequence[str],
+        embed: EmbedFn,
+        dim: int,
+        dtype: str = "float32",
+    ) -> np.ndarray:
+        """Async wrapper for embed() that keeps the event loop responsive."""
+        return await asyncio.to_thread(self.embed, texts, embed, dim, dtype)
@@ -0,0 +1,53 @@
+"""Fixtures shared by the test modules."""
+
+import asyncio
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from raggamuffin.database import create_all, get_engine
+from raggamuffin.store import Store
+
+SessionTest = Callable[[AsyncSession], Awaitable[None]]
+StoreSessionTest = Callable[[Store, AsyncSession], Awaitable[None]]
+
+
+@pytest.fixture
+def database(tmp_path: Path) -> Path:
+    return tmp_path / "test.db"
+
+
+@pytest.fixture
+def in_session(database: Path) -> Callable[[SessionTest], None]:
+    """Run an async test with a session on a fresh database."""
+
+    async def run(test: SessionTest) -> None:
+        engine = get_engine(database, echo=False)
+        try:
+            await create_all(engine)
+            async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+                await test(session)
+        finally:
+            await engine.dispose()
+
+    return lambda test: asyncio.run(run(test))
+
+
+@pytest.fixture
+def in_store_session(database: Path) -> Callable[[StoreSessionTest], None]:
+    """Run an async test with a Store for importer writes and a session for
+    the rest."""
+
+    async def run(test: StoreSessionTest) -> None:
+        engine = get_engine(database, echo=False)
+        try:
+            async with Store(database) as store:
+                sessions = async_sessionmaker(engine, expire_on_commit=False)
+                async with sessions() as session:
+                    await test(store, session)
+        finally:
+            await engine.dispose()
+
+    return lambda test: asyncio.run(run(test))
@@ -0,0 +1,195 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import insert, text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from raggamuffin.backfill import (
+    TASKS,
+    BackfillConfig,
+    BackfillScheduler,
+    record_query_hits,
+)
+from raggamuffin.cache import index_generation
+from raggamuffin.models import (
+    BackfillFailureTable,
+    BackfillStateTable,
+    ChunkTable,
+    DocumentTable,
+    MessageTable,
+    SourceTable,
+    TextDocumentTable,
+)
+from raggamuffin.store import Store
+
+TASK = TASKS["chunk.dense_embedding"]
+# Batches of one item, without throttling
+CONFIG = BackfillConfig(batch_size=1, cpu_budget=1, retry_delay=0)
+
+
+async def add_chunks(
+    session: AsyncSession,
+    texts: list[str],
+    event_dates: Optional[dict[str, datetime]] = None,
+) -> uuid.UUID:
+    """One document with one chunk per text; returns the source id."""
+    source_id = uuid.uuid4()
+    await session.execute(
+        insert(SourceTable), [{"id": source_id, "source_type_id": uuid.uuid4()}]
+    )
+    for chunk_text in texts:
+        document_id = uuid.uuid4()
+        await session.execute(
+            insert(DocumentTable),
+            [{"id": document_id, "type": "text_document", "source_id": source_id}],
+        )
+        await session.execute(
+            insert(TextDocumentTable), [{"id": document_id, "text": chunk_text}]
+        )
+        if event_dates and chunk_text in event_dates:
+            await session.execute(
+                insert(MessageTable),
+                [
+                    {
+                        "id": document_id,
+                        "sender_id": uuid.uuid4(),
+                        "recipient_id": uuid.uuid4(),
+                        "content": chunk_text,
+                        "event_date": event_dates[chunk_text],
+                    }
+                ],
+            )
+        session.add(ChunkTable(document_id=document_id, sequence=0, text=chunk_text))
+    await session.commit()
+    return source_id
+
+
+async def chunk_id(session: AsyncSession, chunk_text: str) -> uuid.UUID:
+    result = await session.execute(
+        select(ChunkTable.id).where(ChunkTable.text == chunk_text)
+    )
+    return result.scalar_one()
+
+
+def test_batches_follow_tiers(in_store_session):
+    async def test(store: Store, session: AsyncSession) -> None:
+        now = datetime.now(timezone.utc)
+        source_id = await add_chunks(
+            session,
+            ["old", "recent", "queried", "rest"],
+            {"old": now - timedelta(days=100), "recent": now - timedelta(days=1)},
+        )
+        await record_query_hits(session, [await chunk_id(session, "queried")])
+        await session.commit()
+        generation = index_generation.get(source_id)
+
+        taken: list[str] = []
+
+        async def embed(texts: list[str]) -> list[bytes]:
+            taken.extend(texts)
+            return [b"\1" for _ in texts]
+
+        await BackfillScheduler({TASK.name: embed}, CONFIG).run(store)
+
+        assert taken[:2] == ["recent", "queried"]
+        assert sorted(taken[2:]) == ["old", "rest"]
+        # One generation per written batch, in the database and in memory
+        source = await session.get(SourceTable, source_id, populate_existing=True)
+        assert source is not None and source.generation == 4
+        assert index_generation.get(source_id) == generation + 4
+
+    in_store_session(test)
+
+
+def test_resumes_after_restart(in_store_session):
+    async def test(store: Store, session: AsyncSession) -> None:
+        await add_chunks(session, ["a", "b", "c"])
+        config = CONFIG.model_copy(update={"batch_size": 2})
+        taken: list[str] = []
+
+        async def embed(texts: list[str]) -> list[bytes]:
+            taken.extend(texts)
+            return [b"\1" for _ in texts]
+
+        assert await BackfillScheduler({TASK.name: embed}, config).run_batch(
+            store, TASK
+        )
+        assert len(taken) == 2
+
+        # A new scheduler only takes what the first one left
+        scheduler = BackfillScheduler({TASK.name: embed}, config)
+        await scheduler.run(store)
+        assert sorted(taken) == ["a", "b", "c"]
+
+        (status,) = await scheduler.status(session, [TASK.name])
+        assert (status.pending, status.processed, status.failed) == (0, 3, 0)
+
+    in_store_session(test)
+
+
+def test_processor_error_retries_batch(in_store_session):
+    async def test(store: Store, session: AsyncSession) -> None:
+        await add_chunks(session, ["a", "b"])
+        calls = 0
+
+        async def embed(texts: list[str]) -> list[bytes]:
+            nonlocal calls
+            calls += 1
+            if calls <= 5:
+                raise ConnectionError("model server down")
+            return [b"\1" for _ in texts]
+
+        await BackfillScheduler({TASK.name: embed}, CONFIG).run(store)
+
+        assert calls == 7
+        # Nothing counts against the items
+        assert (await session.execute(select(BackfillFailureTable))).all() == []
+        state = await session.get(BackfillStateTable, TASK.name)
+        assert state is not None and (state.processed, state.failed) == (2, 0)
+
+    in_store_session(test)
+
+
+def test_items_without_value_are_skipped(in_store_session):
+    async def test(store: Store, session: AsyncSession) -> None:
+        await add_chunks(session, ["good", "bad"])
+        config = CONFIG.model_copy(update={"batch_size": 2, "max_attempts": 2})
+        taken: list[str] = []
+
+        async def embed(texts: list[str]) -> list[Optional[bytes]]:
+            taken.extend(texts)
+            return [None if t == "bad" else b"\1" for t in texts]
+
+        scheduler = BackfillScheduler({TASK.name: embed}, config)
+        await scheduler.run(store)
+
+        assert sorted(taken) == ["bad", "bad", "good"]
+        failure = (await session.execute(select(BackfillFailureTable))).scalar_one()
+        assert failure.item_id == await chunk_id(session, "bad")
+        assert failure.attempts == 2
+        (status,) = await scheduler.status(session, [TASK.name])
+        assert (status.pending, status.processed, status.failed) == (0, 1, 2)
+
+    in_store_session(test)
+
+
+def test_tiers_are_index_ordered(in_session):
+    async def test(session: AsyncSession) -> None:
+        scheduler = BackfillScheduler({})
+        for task in TASKS.values():
+            plans = []
+            for tier in scheduler.tiers(task):
+                sql = tier.limit(10).compile(
+                    dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}
+                )
+                result = await session.execute(text(f"EXPLAIN QUERY PLAN {sql}"))
+                plans.append(" | ".join(str(row[-1]) for row in result))
+            assert not [plan for plan in plans if "TEMP B-TREE" in plan], task.name
+            # The rest of the backlog is scanned along the needs-X index
+            table = task.table.__tablename__
+            assert f"SCAN {table} USING INDEX {task.needs_index}" in plans[-1]
+
+    in_session(test)
@@ -0,0 +1,29 @@
+import uuid
+
+from raggamuffin.cache import IndexGeneration, QueryCache
+
+
+def test_results_of_query_overlapping_ingest_are_stale():
+    generations = IndexGeneration()
+    cache = QueryCache(generations=generations)
+    source_id = uuid.uuid4()
+
+    snapshot = cache.snapshot([source_id])
+    # An ingest commits while the query is still retrieving
+    generations.bump(source_id)
+    cache.put_results("query", ["before ingest"], snapshot=snapshot)
+
+    assert cache.get_results("query") is None
+
+
+def test_results_stay_valid_until_their_source_changes():
+    generations = IndexGeneration()
+    cache = QueryCache(generations=generations)
+    source_id, other_id = uuid.uuid4(), uuid.uuid4()
+
+    cache.put_results("Query?", ["hit"], snapshot=cache.snapshot([source_id]))
+    generations.bump(other_id)
+    assert cache.get_results("query") == ["hit"]
+
+    generations.bump(source_id)
+    assert cache.get_results("query") is None
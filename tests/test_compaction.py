@@ -0,0 +1,45 @@
+import asyncio
+from pathlib import Path
+
+from sqlalchemy import text
+
+from raggamuffin.compaction import CompactionConfig, incremental_vacuum, vacuum
+from raggamuffin.database import create_all, get_engine
+
+FILLER = text("CREATE TABLE filler (id INTEGER PRIMARY KEY, data BLOB)")
+
+
+async def freelist_count(conn) -> int:
+    return (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar_one()
+
+
+def test_incremental_vacuum_frees_pages_per_step(tmp_path: Path):
+    async def run() -> None:
+        engine = get_engine(tmp_path / "test.db", echo=False)
+        try:
+            await create_all(engine)
+            # Switch to auto_vacuum=INCREMENTAL, then leave free pages behind
+            await vacuum(engine, CompactionConfig(full_vacuum=True))
+            async with engine.begin() as conn:
+                await conn.execute(FILLER)
+                await conn.execute(
+                    text("INSERT INTO filler (data) VALUES (:data)"),
+                    [{"data": bytes(8192)} for _ in range(600)],
+                )
+                await conn.execute(text("DELETE FROM filler"))
+
+            async with engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                free = await freelist_count(conn)
+                assert free > 1000
+
+                await incremental_vacuum(conn, 500)
+                assert await freelist_count(conn) == free - 500
+
+            await vacuum(engine, CompactionConfig(vacuum_pages=500))
+            async with engine.connect() as conn:
+                assert await freelist_count(conn) == 0
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
@@ -0,0 +1,65 @@
+import uuid
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from raggamuffin.context import expand_context
+from raggamuffin.models import ChunkTable
+
+SOURCE = "".join(f"Sentence number {n}. " for n in range(100))
+SIZE, STEP = 200, 150
+
+
+def chunk_source(document_id: uuid.UUID) -> list[ChunkTable]:
+    """Overlapping chunks of SOURCE, as a chunker would produce."""
+    return [
+        ChunkTable(
+            document_id=document_id,
+            sequence=sequence,
+            start_offset=start,
+            end_offset=min(start + SIZE, len(SOURCE)),
+            text=SOURCE[start : start + SIZE],
+            dense_embedding=b"\0" * 1536,
+        )
+        for sequence, start in enumerate(range(0, len(SOURCE), STEP))
+    ]
+
+
+def test_expand_context_stitches_neighbours(in_session):
+    async def test(session: AsyncSession) -> None:
+        chunks = chunk_source(uuid.uuid4())
+        session.add_all(chunks)
+        await session.commit()
+
+        # Hits 9 and 7 share a window, 2 gets its own; best ranked first
+        windows = await expand_context(session, [chunks[9], chunks[2], chunks[7]])
+
+        assert [(w.first_sequence, w.last_sequence) for w in windows] == [
+            (6, 10),
+            (1, 3),
+        ]
+        assert windows[0].hit_ids == [chunks[9].id, chunks[7].id]
+        for window in windows:
+            assert window.text == SOURCE[window.start_offset : window.end_offset]
+
+    in_session(test)
+
+
+def test_neighbour_lookup_uses_composite_index(in_session):
+    async def test(session: AsyncSession) -> None:
+        plan = await session.execute(
+            text(
+                "EXPLAIN QUERY PLAN SELECT text FROM chunk "
+                "WHERE document_id = :document_id AND sequence BETWEEN 1 AND 3"
+            ),
+            {"document_id": uuid.uuid4().hex},
+        )
+        indexes = await session.execute(text("PRAGMA index_list(chunk)"))
+
+        assert "ix_chunk_document_sequence" in " ".join(
+            str(row[-1]) for row in plan.all()
+        )
+        # The composite index also serves lookups by document_id alone
+        assert "ix_chunk_document_id" not in {row[1] for row in indexes.all()}
+
+    in_session(test)
@@ -0,0 +1,94 @@
+import asyncio
+from pathlib import Path
+
+from sqlmodel import select
+
+from raggamuffin.database import ShardRouter
+from raggamuffin.models import SourceTypeTable
+
+
+async def add_slug(router: ShardRouter, key: str) -> None:
+    async with router.session(key) as session:
+        session.add(SourceTypeTable(slug=key))
+        await session.commit()
+
+
+async def slugs(router: ShardRouter, keys=None) -> list[str]:
+    rows = await router.fan_out(select(SourceTypeTable.slug), keys)
+    return sorted(row.slug for row in rows)
+
+
+def test_routing_and_fan_out(tmp_path: Path):
+    async def run() -> None:
+        router = ShardRouter(tmp_path)
+        try:
+            await add_slug(router, "mail")
+            await add_slug(router, "chat")
+
+            assert router.keys() == ["chat", "mail"]
+            assert await slugs(router) == ["chat", "mail"]
+            assert await slugs(router, ["mail"]) == ["mail"]
+
+            async with router.attached() as conn:
+                result = await conn.exec_driver_sql(
+                    'SELECT slug FROM "mail".source_type '
+                    'UNION ALL SELECT slug FROM "chat".source_type'
+                )
+                assert sorted(result.scalars()) == ["chat", "mail"]
+        finally:
+            await router.dispose()
+
+    asyncio.run(run())
+
+
+def test_reads_do_not_create_shards(tmp_path: Path):
+    async def run() -> None:
+        router = ShardRouter(tmp_path)
+        try:
+            await add_slug(router, "mail")
+            assert await slugs(router, ["mail", "missing"]) == ["mail"]
+            async with router.attached(["mail", "missing"]) as conn:
+                result = await conn.exec_driver_sql("PRAGMA database_list")
+                assert [row.name for row in result] == ["main", "mail"]
+        finally:
+            await router.dispose()
+        assert router.keys() == ["mail"]
+
+    asyncio.run(run())
+
+
+def test_remove_waits_for_sessions(tmp_path: Path):
+    async def run() -> None:
+        router = ShardRouter(tmp_path)
+        try:
+            await add_slug(router, "mail")
+            await add_slug(router, "chat")
+            entered, release = asyncio.Event(), asyncio.Event()
+
+            async def hold() -> list[str]:
+                async with router.session("mail") as session:
+                    entered.set()
+                    await release.wait()
+                    result = await session.execute(select(SourceTypeTable.slug))
+                    return list(result.scalars())
+
+            holder = asyncio.create_task(hold())
+            await entered.wait()
+            removal = asyncio.create_task(router.remove("mail"))
+            await asyncio.sleep(0.05)
+            assert not removal.done()
+            assert router.shard_path("mail").exists()
+
+            release.set()
+            assert await holder == ["mail"]
+            await removal
+            assert router.keys() == ["chat"]
+            assert await slugs(router) == ["chat"]
+
+            await router.rebuild("chat")
+            assert router.keys() == ["chat"]
+            assert await slugs(router) == []
+        finally:
+            await router.dispose()
+
+    asyncio.run(run())
@@ -0,0 +1,137 @@
+import uuid
+
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col, func, select
+
+from raggamuffin.dedup import DedupConfig, NearDuplicateDetector, optimal_bands
+from raggamuffin.models import ChunkLSHBandTable, ChunkTable
+
+TEXT = "Quoted replies repeat the same paragraph in every message of a thread."
+
+
+def chunk(text: str = TEXT) -> ChunkTable:
+    return ChunkTable(document_id=uuid.uuid4(), text=text)
+
+
+async def assign(
+    session: AsyncSession, detector: NearDuplicateDetector, *chunks: ChunkTable
+) -> None:
+    session.add_all(chunks)
+    await detector.assign(session, chunks)
+    await session.commit()
+
+
+def test_duplicate_becomes_alias(in_session):
+    async def test(session: AsyncSession) -> None:
+        detector = NearDuplicateDetector()
+        canonical, duplicate = chunk(), chunk()
+        await assign(session, detector, canonical)
+        await assign(session, detector, duplicate)
+
+        assert canonical.canonical_id is None
+        assert duplicate.canonical_id == canonical.id
+
+    in_session(test)
+
+
+def test_deleted_canonical_chunk_is_skipped(in_session):
+    async def test(session: AsyncSession) -> None:
+        detector = NearDuplicateDetector()
+        deleted = chunk()
+        await assign(session, detector, deleted)
+        # Deleting a chunk leaves its band rows behind until compaction
+        await session.execute(
+            delete(ChunkTable).where(col(ChunkTable.id) == deleted.id)
+        )
+        await session.commit()
+
+        duplicate = chunk()
+        await assign(session, detector, duplicate)
+        assert duplicate.canonical_id is None
+
+    in_session(test)
+
+
+def test_reassign_canonical_chunk(in_session):
+    async def test(session: AsyncSession) -> None:
+        detector = NearDuplicateDetector()
+        canonical = chunk()
+        await assign(session, detector, canonical)
+        await assign(session, detector, canonical)
+
+        bands = await session.execute(
+            select(func.count()).where(ChunkLSHBandTable.chunk_id == canonical.id)
+        )
+        assert canonical.canonical_id is None
+        assert bands.scalar_one() == detector.bands
+
+    in_session(test)
+
+
+def test_bands_find_pairs_at_threshold():
+    config = DedupConfig()
+    bands, rows = optimal_bands(config.threshold, config.num_perm)
+    assert bands * rows <= config.num_perm
+    # Probability that a pair right at the threshold becomes a candidate
+    assert 1 - (1 - config.threshold**rows) ** bands > 0.9
+
+
+async def canonical_of(session: AsyncSession, chunk: ChunkTable):
+    result = await session.execute(
+        select(ChunkTable.canonical_id).where(col(ChunkTable.id) == chunk.id)
+    )
+    return result.scalar_one()
+
+
+def test_aliases_follow_their_canonical(in_session):
+    other = "A completely different paragraph about the quarterly budget review."
+
+    async def test(session: AsyncSession) -> None:
+        detector = NearDuplicateDetector()
+        root, middle, alias = chunk(other), chunk(), chunk()
+        await assign(session, detector, root)
+        await assign(session, detector, middle)
+        await assign(session, detector, alias)
+        assert alias.canonical_id == middle.id
+
+        # middle's text changes into a duplicate of root: no chain alias ->
+        # middle -> root, alias moves over to root
+        middle.text = other
+        await assign(session, detector, middle)
+        assert middle.canonical_id == root.id
+        assert await canonical_of(session, alias) == root.id
+
+        # A candidate that is an alias resolves to its canonical chunk
+        late = chunk()
+        await session.execute(
+            update(ChunkTable)
+            .where(col(ChunkTable.id) == alias.id)
+            .values(canonical_id=None)
+        )
+        await detector.rebuild_bands(session)
+        await session.execute(
+            update(ChunkTable)
+            .where(col(ChunkTable.id) == alias.id)
+            .values(canonical_id=root.id)
+        )
+        await assign(session, detector, late)
+        assert late.canonical_id == root.id
+
+    in_session(test)
+
+
+def test_rebuild_bands_for_new_layout(in_session):
+    async def test(session: AsyncSession) -> None:
+        canonical = chunk()
+        await assign(session, NearDuplicateDetector(), canonical)
+
+        detector = NearDuplicateDetector(DedupConfig(threshold=0.6))
+        assert await detector.rebuild_bands(session) == 1
+        await session.commit()
+
+        duplicate = chunk()
+        await assign(session, detector, duplicate)
+        assert duplicate.canonical_id == canonical.id
+
+    in_session(test)
@@ -0,0 +1,51 @@
+from pathlib import Path
+
+import pytest
+
+from raggamuffin.handlers import DocumentHandler
+
+FILES = [
+    "a.txt",
+    "b.md",
+    ".hidden.txt",
+    "notes/c.txt",
+    "notes/deep/d.txt",
+    "docs/e.md",
+    "docs/guide/f.md",
+    "docs/guide/api/g.md",
+    "docs/guide/api/h.txt",
+    "other/docs/i.md",
+]
+
+
+@pytest.mark.parametrize(
+    "glob",
+    [
+        "*.txt",
+        "**/*.txt",
+        "docs/**/*.md",
+        "docs/*/*.md",
+        "**/docs/*.md",
+        "**/guide/**/*",
+        "notes/*",
+        "**",
+        "?.md",
+        "[ab].*",
+    ],
+)
+def test_matches_like_glob(tmp_path: Path, glob: str):
+    for name in FILES:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+
+    handler = DocumentHandler(tmp_path, glob)
+    found = {path for path in tmp_path.glob(glob) if path.is_file()}
+    matched = {tmp_path / name for name in FILES if handler.matches(tmp_path / name)}
+    assert matched == found
+
+
+def test_matches_outside_path(tmp_path: Path):
+    handler = DocumentHandler(tmp_path / "watched")
+    assert handler.matches(tmp_path / "watched" / "a.txt")
+    assert not handler.matches(tmp_path / "a.txt")
@@ -0,0 +1,104 @@
+import asyncio
+from email import policy
+from email.parser import BytesParser
+from pathlib import Path
+
+from sqlmodel import select
+
+from raggamuffin.database import get_engine
+from raggamuffin.importers import MailImporter
+from raggamuffin.importers.mail import _body_text, can_resume_mbox, mbox_identity
+from raggamuffin.models import (
+    DocumentTable,
+    EntityIdentifierTable,
+    MessageRecipientLink,
+)
+from raggamuffin.store import Store
+
+
+def message(number: int, cc: str = "") -> str:
+    return (
+        "From sender@example.com Mon Jan  1 00:00:00 2024\n"
+        "From: Sender <sender@example.com>\n"
+        "To: one@example.com, two@example.com\n"
+        + (f"Cc: {cc}\n" if cc else "")
+        + f"Subject: Message {number}\n"
+        f"Message-ID: <{number}@example.com>\n"
+        f"\n"
+        f"Body {number}\n"
+        f"\n"
+    )
+
+
+async def import_mail(database: Path, path: Path) -> list[str]:
+    """Import path; returns the Message-IDs in the database afterwards."""
+    async with Store(database) as store:
+        await MailImporter(path).run(store)
+        async with store.read() as session:
+            result = await session.execute(select(DocumentTable.external_id))
+            return sorted(result.scalars().all())
+
+
+def test_resume_after_mbox_rewrite(tmp_path: Path):
+    database, mbox = tmp_path / "test.db", tmp_path / "mbox"
+    mbox.write_text("".join(message(n) for n in range(1, 5)))
+    assert len(asyncio.run(import_mail(database, mbox))) == 4
+
+    # Expunged two messages and received a new one: shorter than before
+    mbox.write_text(message(1) + message(4) + message(5))
+    external_ids = asyncio.run(import_mail(database, mbox))
+
+    assert "<5@example.com>" in external_ids
+    assert len(external_ids) == 5
+
+
+def test_can_resume_mbox(tmp_path: Path):
+    mbox = tmp_path / "mbox"
+    mbox.write_text(message(1) + message(2))
+    size = mbox.stat().st_size
+    identity = mbox_identity(mbox)
+    boundary = len(message(1))
+
+    assert can_resume_mbox(mbox, boundary, identity, size)
+    assert can_resume_mbox(mbox, size, identity, size)
+    # Inside a message, unknown file, or a file that shrank
+    assert not can_resume_mbox(mbox, boundary - 3, identity, size)
+    assert not can_resume_mbox(mbox, boundary, None, size)
+    assert not can_resume_mbox(mbox, boundary, identity, size + 1)
+
+
+def test_all_recipients_resolved(tmp_path: Path):
+    database, mbox = tmp_path / "test.db", tmp_path / "mbox"
+    mbox.write_text(message(1, cc="Three <three@example.com>, one@example.com"))
+
+    async def recipients() -> dict[str, str]:
+        await import_mail(database, mbox)
+        engine = get_engine(database, echo=False)
+        try:
+            async with engine.connect() as conn:
+                result = await conn.execute(
+                    select(EntityIdentifierTable.value, MessageRecipientLink.role).join(
+                        MessageRecipientLink,
+                        MessageRecipientLink.recipient_id  # type: ignore[arg-type]
+                        == EntityIdentifierTable.entity_id,
+                    )
+                )
+                return dict(result.tuples().all())
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(recipients()) == {
+        "one@example.com": "to",
+        "two@example.com": "to",
+        "three@example.com": "cc",
+    }
+
+
+def test_body_with_unknown_charset():
+    parsed = BytesParser(policy=policy.default).parsebytes(
+        b"From: sender@example.com\n"
+        b'Content-Type: text/plain; charset="x-unknown"\n'
+        b"\n"
+        b"caf\xc3\xa9\n"
+    )
+    assert _body_text(parsed) == "café"
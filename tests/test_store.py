@@ -0,0 +1,306 @@
+"""Store tests, and a load test comparing Store with a shared engine.
+
+The load test runs ingest tasks and random-lookup readers concurrently,
+once against a plain shared engine (get_engine) and once through a Store,
+and reports read latency, errors and write grouping:
+
+    uv run python tests/test_store.py --documents 200000 --writers 8
+
+test_concurrent_ingest_and_reads runs a small version of it.
+"""
+
+import argparse
+import asyncio
+import random
+import shutil
+import statistics
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncContextManager, Callable, Optional
+
+import pytest
+from pydantic import BaseModel, Field
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlmodel import col, func, select
+
+from raggamuffin.database import create_all, get_engine
+from raggamuffin.models import DocumentTable, TextDocumentTable
+from raggamuffin.store import Store, StoreConfig
+
+SOURCE_ID = uuid.UUID(int=1)
+LOOKUP_SIZE = 20
+
+
+class LoadConfig(BaseModel):
+    """Size of a load test run."""
+
+    documents: int = 200_000
+    writers: int = 8
+    batches: int = 40
+    batch_size: int = 250
+    readers: int = 4
+
+
+class LoadResult(BaseModel):
+    """Read latencies (seconds) and errors of one load test run."""
+
+    name: str
+    latencies: list[float] = Field(default_factory=list)
+    errors: list[str] = Field(default_factory=list)
+    written: int = 0
+    seconds: float = 0.0
+    group_size: Optional[float] = None
+
+    def quantile(self, q: float) -> float:
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def __str__(self) -> str:
+        line = (
+            f"{self.name:<14} reads={len(self.latencies):>6} "
+            f"p50={self.quantile(0.5) * 1000:6.1f}ms "
+            f"p99={self.quantile(0.99) * 1000:6.1f}ms "
+            f"mean={statistics.mean(self.latencies) * 1000:6.1f}ms "
+            f"errors={len(self.errors)} written={self.written} "
+            f"in {self.seconds:.1f}s"
+        )
+        if self.group_size is not None:
+            line += f" ({self.group_size:.1f} operations per transaction)"
+        return line
+
+
+def document_rows(count: int) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    now = datetime.now(timezone.utc)
+    documents = [
+        {
+            "id": uuid.uuid4(),
+            "type": "text_document",
+            "source_id": SOURCE_ID,
+            "created": now,
+            "metadata_json": {"value": random.random()},
+        }
+        for _ in range(count)
+    ]
+    texts = [{"id": row["id"], "text": "lorem ipsum " * 50} for row in documents]
+    return documents, texts
+
+
+async def write_rows(session: AsyncSession, count: int) -> None:
+    documents, texts = document_rows(count)
+    await session.execute(insert(DocumentTable), documents)
+    await session.execute(insert(TextDocumentTable), texts)
+
+
+async def seed(path: Path, documents: int) -> list[uuid.UUID]:
+    """Create a database of documents; returns their ids."""
+    async with Store(path) as store:
+        for start in range(0, documents, 5000):
+            count = min(5000, documents - start)
+            await store.write(lambda session: write_rows(session, count))
+        async with store.read() as session:
+            result = await session.execute(select(DocumentTable.id))
+            return list(result.scalars().all())
+
+
+async def read_loop(
+    sessions: Callable[[], AsyncContextManager[AsyncSession]],
+    ids: list[uuid.UUID],
+    stop: asyncio.Event,
+    result: LoadResult,
+) -> None:
+    while not stop.is_set():
+        lookup = random.sample(ids, LOOKUP_SIZE)
+        started = time.perf_counter()
+        try:
+            async with sessions() as session:
+                rows = await session.execute(
+                    select(DocumentTable.id, TextDocumentTable.text)
+                    .join(TextDocumentTable)
+                    .where(col(DocumentTable.id).in_(lookup))
+                )
+                rows.all()
+            result.latencies.append(time.perf_counter() - started)
+        except Exception as e:
+            result.errors.append(f"{type(e).__name__}: {e}")
+        await asyncio.sleep(0.002)
+
+
+async def run_load(
+    result: LoadResult,
+    sessions: Callable[[], AsyncContextManager[AsyncSession]],
+    write: Callable[[int], Any],
+    ids: list[uuid.UUID],
+    config: LoadConfig,
+) -> LoadResult:
+    stop = asyncio.Event()
+
+    async def writer() -> None:
+        for _ in range(config.batches):
+            try:
+                await write(config.batch_size)
+                result.written += config.batch_size
+            except Exception as e:
+                result.errors.append(f"{type(e).__name__}: {e}")
+
+    started = time.perf_counter()
+    readers = [
+        asyncio.create_task(read_loop(sessions, ids, stop, result))
+        for _ in range(config.readers)
+    ]
+    await asyncio.gather(*(writer() for _ in range(config.writers)))
+    stop.set()
+    await asyncio.gather(*readers)
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+async def load_shared_engine(
+    path: Path, ids: list[uuid.UUID], config: LoadConfig
+) -> LoadResult:
+    """Readers and writers sharing one plain engine."""
+    engine = get_engine(path, echo=False)
+    try:
+        async with engine.connect() as conn:
+            # As before any Store opened it: a Store switches files to WAL
+            await conn.exec_driver_sql("PRAGMA journal_mode=DELETE")
+        await create_all(engine)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+        async def write(count: int) -> None:
+            async with sessions() as session:
+                await write_rows(session, count)
+                await session.commit()
+
+        return await run_load(
+            LoadResult(name="shared engine"), sessions, write, ids, config
+        )
+    finally:
+        await engine.dispose()
+
+
+async def load_store(
+    path: Path, ids: list[uuid.UUID], config: LoadConfig
+) -> LoadResult:
+    """Writers through the write actor, readers on the read-only pool."""
+    async with Store(path, StoreConfig(read_connections=config.readers)) as store:
+
+        async def write(count: int) -> None:
+            await store.write(lambda session: write_rows(session, count))
+
+        result = await run_load(
+            LoadResult(name="store"), store.read, write, ids, config
+        )
+        result.group_size = store.writer.stats.group_size
+        return result
+
+
+async def compare(directory: Path, config: LoadConfig) -> list[LoadResult]:
+    """Run the load test against a shared engine and a Store, same data."""
+    seeded = directory / "seed.db"
+    ids = await seed(seeded, config.documents)
+    results = []
+    for name, load in (("shared.db", load_shared_engine), ("store.db", load_store)):
+        shutil.copy(seeded, directory / name)
+        results.append(await load(directory / name, ids, config))
+    return results
+
+
+def test_concurrent_ingest_and_reads(tmp_path: Path):
+    config = LoadConfig(documents=2000, writers=4, batches=10, batch_size=50)
+
+    async def run() -> tuple[LoadResult, int]:
+        path = tmp_path / "test.db"
+        ids = await seed(path, config.documents)
+        result = await load_store(path, ids, config)
+        async with Store(path) as store, store.read() as session:
+            count = await session.execute(
+                select(func.count()).select_from(DocumentTable)
+            )
+            return result, count.scalar_one()
+
+    result, documents = asyncio.run(run())
+
+    assert result.errors == []
+    assert result.latencies
+    assert documents == config.documents + result.written
+    assert result.written == config.writers * config.batches * config.batch_size
+
+
+def test_failing_operation_only_fails_its_caller(tmp_path: Path):
+    async def run() -> None:
+        async with Store(tmp_path / "test.db") as store:
+
+            async def fail(session: AsyncSession) -> None:
+                await write_rows(session, 1)
+                raise ValueError("failed")
+
+            results = await asyncio.gather(
+                store.write(lambda session: write_rows(session, 1)),
+                store.write(fail),
+                store.write(lambda session: write_rows(session, 1)),
+                return_exceptions=True,
+            )
+            assert [type(result) for result in results] == [
+                type(None),
+                ValueError,
+                type(None),
+            ]
+            async with store.read() as session:
+                count = await session.execute(
+                    select(func.count()).select_from(DocumentTable)
+                )
+                assert count.scalar_one() == 2
+
+    asyncio.run(run())
+
+
+def test_cancelled_caller_of_failing_operation(tmp_path: Path):
+    async def run() -> None:
+        async with Store(tmp_path / "test.db") as store:
+            # Set from the write actor's thread
+            started = threading.Event()
+
+            async def fail(session: AsyncSession) -> None:
+                started.set()
+                await asyncio.sleep(0.1)
+                raise ValueError("failed")
+
+            waiter = asyncio.create_task(store.write(fail))
+            await asyncio.to_thread(started.wait)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+
+            # Hangs or raises if the failure killed the write actor
+            await asyncio.wait_for(
+                store.write(lambda session: write_rows(session, 1)), timeout=10
+            )
+            assert store.writer.running
+            assert store.writer.stats.failed == 1
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    for name, field in LoadConfig.model_fields.items():
+        parser.add_argument(
+            f"--{name.replace('_', '-')}", type=int, default=field.default
+        )
+    parser.add_argument("--directory", type=Path, default=None)
+    args = parser.parse_args()
+
+    config = LoadConfig(
+        **{name: getattr(args, name) for name in LoadConfig.model_fields}
+    )
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        for result in asyncio.run(compare(Path(directory), config)):
+            print(result)
+            for error in sorted({error.splitlines()[0] for error in result.errors}):
+                print(f"  {error}")
@@ -0,0 +1,72 @@
+import asyncio
+import json
+from pathlib import Path
+
+from sqlmodel import func, select
+
+from raggamuffin.importers import TelegramImporter
+from raggamuffin.importers.base import ImportStats
+from raggamuffin.models import ImageTable
+from raggamuffin.store import Store
+
+
+def write_export(directory: Path, photos: int, photo_size: int) -> Path:
+    (directory / "photos").mkdir()
+    messages = []
+    for number in range(1, photos + 1):
+        photo = f"photos/{number}.jpg"
+        (directory / photo).write_bytes(b"\xff" * photo_size)
+        messages.append(
+            {
+                "id": number,
+                "type": "message",
+                "date_unixtime": str(1700000000 + number),
+                "from": "Friend",
+                "from_id": "user2",
+                "text": f"Photo {number}",
+                "photo": photo,
+            }
+        )
+    path = directory / "result.json"
+    path.write_text(
+        json.dumps(
+            {"name": "Friend", "type": "personal_chat", "id": 2, "messages": messages}
+        )
+    )
+    return path
+
+
+async def import_export(
+    database: Path, path: Path, **kwargs
+) -> tuple[ImportStats, int]:
+    async with Store(database) as store:
+        stats = await TelegramImporter(path, **kwargs).run(store)
+        async with store.read() as session:
+            images = await session.execute(select(func.count()).select_from(ImageTable))
+            return stats, images.scalar_one()
+
+
+def test_image_bytes_bound_batches(tmp_path: Path):
+    path = write_export(tmp_path, photos=6, photo_size=1000)
+    stats, images = asyncio.run(
+        import_export(tmp_path / "test.db", path, batch_bytes=2500)
+    )
+
+    assert images == 6
+    # Three photos pass the budget: six photos take two batches, not one
+    assert stats.batches == 2
+
+
+def test_reimport_from_another_path(tmp_path: Path):
+    database = tmp_path / "test.db"
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    write_export(tmp_path / "a", photos=3, photo_size=10)
+    moved = write_export(tmp_path / "b", photos=4, photo_size=10)
+
+    stats, images = asyncio.run(import_export(database, tmp_path / "a" / "result.json"))
+    assert stats.documents == 6
+    # Same chat in a new folder: a new source, but only message 4 is new
+    stats, images = asyncio.run(import_export(database, moved))
+    assert stats.documents == 2
+    assert images == 4
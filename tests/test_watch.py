@@ -0,0 +1,56 @@
+import asyncio
+from pathlib import Path
+
+from sqlmodel import select
+
+from raggamuffin.cache import index_generation
+from raggamuffin.handlers import DocumentHandler
+from raggamuffin.models import DocumentTable, TextDocumentTable
+from raggamuffin.store import Store
+from raggamuffin.watch import handler_ingest
+
+
+async def documents(store: Store) -> dict[str, str]:
+    async with store.read() as session:
+        result = await session.execute(
+            select(DocumentTable.external_id, TextDocumentTable.text).join(
+                TextDocumentTable
+            )
+        )
+        return {external_id: text for external_id, text in result.tuples()}
+
+
+def test_ingest_writes_changed_files(tmp_path: Path):
+    watched = tmp_path / "watched"
+    path = watched / "notes" / "a.txt"
+    path.parent.mkdir(parents=True)
+
+    async def run() -> None:
+        async with Store(tmp_path / "test.db") as store:
+            ingest = handler_ingest(DocumentHandler(watched), store)
+
+            path.write_text("first")
+            await ingest(path)
+            assert await documents(store) == {"notes/a.txt": "first"}
+            async with store.read() as session:
+                (source_id,) = (
+                    await session.execute(select(DocumentTable.source_id))
+                ).one()
+            generation = index_generation.get(source_id)
+            assert generation > 0
+
+            # Unchanged content is not rewritten
+            await ingest(path)
+            assert index_generation.get(source_id) == generation
+
+            path.write_text("second")
+            await ingest(path)
+            assert await documents(store) == {"notes/a.txt": "second"}
+            assert index_generation.get(source_id) == generation + 1
+
+            path.unlink()
+            await ingest(path)
+            assert await documents(store) == {}
+            assert index_generation.get(source_id) == generation + 2
+
+    asyncio.run(run())
@@ -0,0 +1,74 @@
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from raggamuffin.workers import WorkerCrashError, WorkerPool, WorkerPoolConfig
+
+DIM = 4
+
+
+def embed(texts: list[str]) -> np.ndarray:
+    """Embed texts; "crash" kills the worker, "once:<path>" kills it once.
+
+    "fail" raises, "slow:<path>" touches path after a delay.
+    """
+    for text in texts:
+        if text == "crash":
+            os._exit(1)
+        if text == "fail":
+            raise ValueError("fail")
+        if text.startswith("slow:"):
+            time.sleep(0.5)
+            Path(text.removeprefix("slow:")).touch()
+        if text.startswith("once:"):
+            marker = Path(text.removeprefix("once:"))
+            if not marker.exists():
+                marker.touch()
+                os._exit(1)
+    return np.array([[len(text)] * DIM for text in texts], dtype="float32")
+
+
+def config(**kwargs) -> WorkerPoolConfig:
+    return WorkerPoolConfig(workers=2, batch_size=1, **kwargs)
+
+
+def test_embed():
+    with WorkerPool(config()) as pool:
+        vectors = pool.embed(["a", "bb", "ccc"], embed, DIM)
+    assert vectors[:, 0].tolist() == [1, 2, 3]
+
+
+def test_pool_usable_after_crash_error():
+    with WorkerPool(config(max_retries=1)) as pool:
+        with pytest.raises(WorkerCrashError):
+            pool.embed(["a", "crash", "b", "c"], embed, DIM)
+        vectors = pool.embed(["a", "bb"], embed, DIM)
+    assert vectors[:, 0].tolist() == [1, 2]
+
+
+def test_crash_not_counted_against_other_batches(tmp_path: Path):
+    # Each crash also fails the batch in flight next to it; losing that
+    # batch twice must not use up its single retry.
+    texts = [
+        f"once:{tmp_path / 'a'}",
+        "x" * 10,
+        f"once:{tmp_path / 'b'}",
+        "y" * 20,
+    ]
+    with WorkerPool(config(max_retries=1)) as pool:
+        vectors = pool.embed(texts, embed, DIM)
+    assert vectors[:, 0].tolist() == [len(text) for text in texts]
+
+
+def test_error_waits_for_batches_in_flight(tmp_path: Path):
+    # The shared memory block may only be unlinked once no worker uses it
+    done = tmp_path / "done"
+    with WorkerPool(config()) as pool:
+        with pytest.raises(ValueError):
+            pool.embed([f"slow:{done}", "fail"], embed, DIM)
+        assert done.exists()
+        vectors = pool.embed(["a", "bb"], embed, DIM)
+    assert vectors[:, 0].tolist() == [1, 2]